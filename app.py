@@ -1,64 +1,38 @@
-import os
-import json
-import datetime
-from flask import Flask, request, jsonify, render_template
-from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
-from src.utils.data_loader import load_course_data
-from src.tools.course_retriever import CourseRetriever
-from src.agent.course_agent import CourseRecommenderAgent
-from src.agent.graph import create_course_recommender_graph
-from src.schema.state import CourseRecommenderState
-
-load_dotenv()
-app = Flask(__name__)
-
-FAISS_INDEX_PATH = "./faiss_store/index"
-
-if os.path.exists(FAISS_INDEX_PATH):
-    print("[INFO] Skipping course JSON load. Using existing FAISS index.")
-    docs = []
-else:
-    print("[INFO] FAISS index not found. Loading course data from JSON.")
-    docs = load_course_data()
-
-course_retriever = CourseRetriever(docs)
-course_agent = CourseRecommenderAgent(course_retriever)
-conversation_graph = create_course_recommender_graph(course_agent)
-
-user_sessions = {}
+import logging
+from flask import Blueprint, Flask, Response, g, request, jsonify, render_template, stream_with_context
+from src.components import WARMUP_ON_START, components
+from src.utils.interest_gate import interest_gate
+from src.utils.llm_call_counter import llm_call_stats
+from src.utils.metrics import metrics
+from src.utils.session_store import SESSION_COOKIE, new_session_id
+from src.utils.single_flight import single_flight_stats
+from src.web_common import (
+    STREAM_OPTIONS, TROUBLE_RESPONSE, TurnStream, build_turn, configure_logging, finish_turn, latest_ai_response,
+    metrics_gauges, turn_config
+)
+
+logger = logging.getLogger(__name__)
+bp = Blueprint("chat", __name__)
 
 def get_user_id():
-    """Simulate getting a unique user ID."""
-    return "user_001"
-
-def get_user_session(user_id: str) -> CourseRecommenderState:
-    """Retrieve or initialize the user session."""
-    if user_id not in user_sessions:
-        user_sessions[user_id] = CourseRecommenderState(
-            messages=[],
-            grade=None,
-            interests=[],
-            credit_preference="any",
-            conversation_stage="greeting",
-            interest_turns=0,
-            has_offered_recommendation=False,
-            next_action=None,
-            agent_scratchpad="",
-            retrieved_courses=[],
-            last_recommendation=None
-        )
-    return user_sessions[user_id]
-
-def save_session(user_id: str, state: CourseRecommenderState):
-    """Persist session in memory."""
-    user_sessions[user_id] = state
-
-@app.route("/")
+    """Session id from the session cookie; new visitors get a fresh one."""
+    user_id = request.cookies.get(SESSION_COOKIE)
+    if not user_id:
+        user_id = g.get("new_session_id") or new_session_id()
+        g.new_session_id = user_id
+    return user_id
+
+@bp.after_app_request
+def set_session_cookie(response):
+    if g.get("new_session_id"):
+        response.set_cookie(SESSION_COOKIE, g.new_session_id, httponly=True, samesite="Lax")
+    return response
+
+@bp.route("/")
 def index():
     return render_template("index.html")
 
-@app.route("/set_grade", methods=["POST"])
+@bp.route("/set_grade", methods=["POST"])
 def set_grade():
     data = request.get_json()
     if not data or 'grade' not in data:
@@ -71,53 +45,62 @@ def set_grade():
     except ValueError:
         return jsonify({"error": "Grade must be a valid number"}), 400
 
-    user_id = get_user_id()
-    state = get_user_session(user_id)
-    state["grade"] = grade
-    save_session(user_id, state)
+    components.sessions.update(get_user_id(), {"grade": grade})
     
     return jsonify({"message": f"Grade set to {grade}"}), 200
 
-@app.route("/chat", methods=["POST"])
+@bp.route("/chat", methods=["POST"])
 def chat():
-    data = request.json
-    message = data.get("message")
-    if not message:
+    turn = build_turn(request.json)
+    if turn is None:
         return jsonify({"error": "Message is required"}), 400
 
     user_id = get_user_id()
-    state = get_user_session(user_id)
-
-    if not state.get("grade"):
+    if not components.sessions.load(user_id).get("grade"):
         return jsonify({"response": "Please set your grade first."}), 400
 
-    state["messages"].append(HumanMessage(content=message))
-
-    if "credit_type" in data:
-        state["credit_preference"] = data["credit_type"]
-
     try:
-        result = conversation_graph.invoke(state)
-        save_session(user_id, result)
-
-        ai_messages = [msg for msg in result["messages"] if msg.type == "ai"]
-        if ai_messages:
-            response = ai_messages[-1].content
-        else:
-            response = "I'm here to help you explore courses! What subjects interest you?"
-        
-        return jsonify({"response": response})
+        config, trace = turn_config(user_id)
+        result = components.graph.invoke(turn, config)
+        return jsonify({"response": latest_ai_response(result), "llm_calls": finish_turn(trace)})
         
     except Exception as e:
-        print(f"Error in chat processing: {e}")
-        return jsonify({
-            "response": "I'm having some trouble right now. Could you tell me about your interests or what subjects you enjoy?"
-        }), 500
+        logger.error(f"Error in chat processing: {e}")
+        return jsonify({"response": TROUBLE_RESPONSE}), 500
+
+@bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same turn as /chat, sent as server-sent events while the graph runs
+    (see TurnStream for the events). The checkpointer saves the session as
+    the graph runs."""
+    turn = build_turn(request.json)
+    if turn is None:
+        return jsonify({"error": "Message is required"}), 400
 
-@app.route("/get_chat_history", methods=["GET"])
-def get_chat_history():
     user_id = get_user_id()
-    state = get_user_session(user_id)
+    if not components.sessions.load(user_id).get("grade"):
+        return jsonify({"response": "Please set your grade first."}), 400
+
+    def events():
+        config, trace = turn_config(user_id)
+        stream = TurnStream(trace)
+        try:
+            for item in components.graph.stream(turn, config, **STREAM_OPTIONS):
+                yield from stream.events(item)
+            yield stream.done()
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            yield stream.error()
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@bp.route("/get_chat_history", methods=["GET"])
+def get_chat_history():
+    state = components.sessions.load(get_user_id())
 
     messages = []
     for msg in state.get("messages", []):
@@ -131,17 +114,15 @@ def get_chat_history():
         "total_messages": len(messages)
     })
 
-@app.route("/clear_history", methods=["POST"])
+@bp.route("/clear_history", methods=["POST"])
 def clear_history():
-    user_id = get_user_id()
-    if user_id in user_sessions:
-        del user_sessions[user_id]
+    components.sessions.delete(get_user_id())
     return jsonify({"message": "Chat history cleared successfully"})
 
-@app.route("/get_user_info", methods=["GET"])
+@bp.route("/get_user_info", methods=["GET"])
 def get_user_info():
     user_id = get_user_id()
-    state = get_user_session(user_id)
+    state = components.sessions.load(user_id)
 
     return jsonify({
         "user_id": user_id,
@@ -153,6 +134,59 @@ def get_user_info():
         "has_offered_recommendation": state.get("has_offered_recommendation", False)
     })
 
+@bp.route("/refresh_index", methods=["POST"])
+def refresh_index():
+    """Load the index again after build_index.py has written a new one.
+
+    Only the worker serving this request reloads at once; the others pick
+    the new build up within INDEX_RELOAD_INTERVAL seconds.
+    """
+    try:
+        result = components.retriever.reload()
+    except Exception as e:
+        logger.error(f"Error refreshing course index: {e}")
+        return jsonify({"error": "Failed to refresh the course index"}), 500
+    return jsonify({"message": "Course index refreshed", **result})
+
+@bp.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once the retriever and graph are built and warm."""
+    components.start_warmup()
+    readiness = components.readiness()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+@bp.route("/get_stats", methods=["GET"])
+def get_stats():
+    return jsonify({
+        "interest_gate": interest_gate.stats(),
+        "query_embedding_cache": components.retriever.embeddings.stats(),
+        "retrieval": components.retriever.stats(),
+        "recommendation_cache": components.agent.recommendation_cache.stats(),
+        "active_sessions": components.sessions.session_count(),
+        "llm_calls": llm_call_stats.stats(),
+        "single_flight": single_flight_stats()
+    })
+
+@bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Latency and token histograms in the Prometheus text format; `?format=json` for JSON."""
+    if request.args.get("format") == "json":
+        return jsonify({**metrics.snapshot(), "gauges": metrics_gauges()})
+    return Response(metrics.prometheus(metrics_gauges()), mimetype="text/plain; version=0.0.4")
+
+
+def create_app(warmup: bool = WARMUP_ON_START) -> Flask:
+    """Application factory; the heavy components are built on first use or by
+    the background warmup."""
+    configure_logging()
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(bp)
+    if warmup:
+        components.start_warmup()
+    return flask_app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
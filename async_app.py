@@ -0,0 +1,206 @@
+"""Asyncio serving mode: the same routes as app.py on Quart, running the graph
+with ainvoke/astream so one process can hold many turns waiting on Bedrock.
+
+Run with an ASGI server, e.g. `hypercorn async_app:app --bind 0.0.0.0:8000`.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from quart import Blueprint, Quart, Response, g, request, jsonify, render_template
+from src.components import WARMUP_ON_START, components
+from src.models.llm_config import BEDROCK_MAX_POOL_CONNECTIONS
+from src.utils.interest_gate import interest_gate
+from src.utils.session_store import SESSION_COOKIE, new_session_id
+from src.utils.single_flight import single_flight_stats
+from src.utils.llm_call_counter import llm_call_stats
+from src.utils.metrics import metrics
+from src.web_common import (
+    STREAM_OPTIONS, TROUBLE_RESPONSE, TurnStream, build_turn, configure_logging, finish_turn, latest_ai_response,
+    metrics_gauges, turn_config
+)
+
+logger = logging.getLogger(__name__)
+bp = Blueprint("chat", __name__)
+
+def get_user_id():
+    """Session id from the session cookie; new visitors get a fresh one."""
+    user_id = request.cookies.get(SESSION_COOKIE)
+    if not user_id:
+        user_id = g.get("new_session_id") or new_session_id()
+        g.new_session_id = user_id
+    return user_id
+
+@bp.after_app_request
+async def set_session_cookie(response):
+    if g.get("new_session_id"):
+        response.set_cookie(SESSION_COOKIE, g.new_session_id, httponly=True, samesite="Lax")
+    return response
+
+
+@bp.before_app_serving
+async def size_default_executor():
+    # boto3 has no asyncio API, so LangChain's async Bedrock calls run in the
+    # loop's default executor; size it to the HTTP pool so that many sessions
+    # can wait on Bedrock at once instead of queueing behind a few threads.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BEDROCK_MAX_POOL_CONNECTIONS, thread_name_prefix="bedrock")
+    )
+
+@bp.route("/")
+async def index():
+    return await render_template("index.html")
+
+@bp.route("/set_grade", methods=["POST"])
+async def set_grade():
+    data = await request.get_json()
+    if not data or 'grade' not in data:
+        return jsonify({"error": "Grade is required"}), 400
+
+    try:
+        grade = int(data.get("grade"))
+        if not 8 <= grade <= 12:
+            return jsonify({"error": "Grade must be between 8 and 12"}), 400
+    except ValueError:
+        return jsonify({"error": "Grade must be a valid number"}), 400
+
+    await components.sessions.aupdate(get_user_id(), {"grade": grade})
+
+    return jsonify({"message": f"Grade set to {grade}"}), 200
+
+@bp.route("/chat", methods=["POST"])
+async def chat():
+    turn = build_turn(await request.get_json())
+    if turn is None:
+        return jsonify({"error": "Message is required"}), 400
+
+    user_id = get_user_id()
+    if not (await components.sessions.aload(user_id)).get("grade"):
+        return jsonify({"response": "Please set your grade first."}), 400
+
+    try:
+        config, trace = turn_config(user_id)
+        result = await components.graph.ainvoke(turn, config)
+        return jsonify({"response": latest_ai_response(result), "llm_calls": finish_turn(trace)})
+
+    except Exception as e:
+        logger.error(f"Error in chat processing: {e}")
+        return jsonify({"response": TROUBLE_RESPONSE}), 500
+
+@bp.route("/chat/stream", methods=["POST"])
+async def chat_stream():
+    """Async counterpart of app.chat_stream with the same event format."""
+    turn = build_turn(await request.get_json())
+    if turn is None:
+        return jsonify({"error": "Message is required"}), 400
+
+    user_id = get_user_id()
+    if not (await components.sessions.aload(user_id)).get("grade"):
+        return jsonify({"response": "Please set your grade first."}), 400
+
+    async def events():
+        config, trace = turn_config(user_id)
+        stream = TurnStream(trace)
+        try:
+            async for item in components.graph.astream(turn, config, **STREAM_OPTIONS):
+                for event in stream.events(item):
+                    yield event
+            yield stream.done()
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            yield stream.error()
+
+    response = Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
+@bp.route("/get_chat_history", methods=["GET"])
+async def get_chat_history():
+    state = await components.sessions.aload(get_user_id())
+
+    messages = []
+    for msg in state.get("messages", []):
+        messages.append({
+            "role": "user" if msg.type == "human" else "bot",
+            "content": msg.content
+        })
+
+    return jsonify({
+        "messages": messages,
+        "total_messages": len(messages)
+    })
+
+@bp.route("/clear_history", methods=["POST"])
+async def clear_history():
+    await components.sessions.adelete(get_user_id())
+    return jsonify({"message": "Chat history cleared successfully"})
+
+@bp.route("/get_user_info", methods=["GET"])
+async def get_user_info():
+    user_id = get_user_id()
+    state = await components.sessions.aload(user_id)
+
+    return jsonify({
+        "user_id": user_id,
+        "grade": state.get("grade"),
+        "interests": state.get("interests", []),
+        "conversation_stage": state.get("conversation_stage"),
+        "interest_turns": state.get("interest_turns", 0),
+        "message_count": len(state.get("messages", [])),
+        "has_offered_recommendation": state.get("has_offered_recommendation", False)
+    })
+
+@bp.route("/refresh_index", methods=["POST"])
+async def refresh_index():
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, components.retriever.reload)
+    except Exception as e:
+        logger.error(f"Error refreshing course index: {e}")
+        return jsonify({"error": "Failed to refresh the course index"}), 500
+    return jsonify({"message": "Course index refreshed", **result})
+
+@bp.route("/ready", methods=["GET"])
+async def ready():
+    components.start_warmup()
+    readiness = components.readiness()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+@bp.route("/get_stats", methods=["GET"])
+async def get_stats():
+    return jsonify({
+        "interest_gate": interest_gate.stats(),
+        "query_embedding_cache": components.retriever.embeddings.stats(),
+        "retrieval": components.retriever.stats(),
+        "recommendation_cache": components.agent.recommendation_cache.stats(),
+        "active_sessions": await components.sessions.asession_count(),
+        "llm_calls": llm_call_stats.stats(),
+        "single_flight": single_flight_stats()
+    })
+
+@bp.route("/metrics", methods=["GET"])
+async def get_metrics():
+    # The session count can query sqlite.
+    gauges = await asyncio.to_thread(metrics_gauges)
+    if request.args.get("format") == "json":
+        return jsonify({**metrics.snapshot(), "gauges": gauges})
+    return Response(metrics.prometheus(gauges), mimetype="text/plain; version=0.0.4")
+
+
+def create_app(warmup: bool = WARMUP_ON_START) -> Quart:
+    configure_logging()
+    quart_app = Quart(__name__)
+    quart_app.register_blueprint(bp)
+    if warmup:
+        quart_app.before_serving(start_warmup)
+    return quart_app
+
+
+async def start_warmup():
+    components.start_warmup()
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    app.run(debug=True)
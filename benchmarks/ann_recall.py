@@ -0,0 +1,142 @@
+"""Recall, latency and memory of each FAISS index type against exact search.
+
+Indexes are built with the same factory as build_index.py, over the vectors
+of an existing store or over a synthetic clustered catalog sized like a
+district-wide one:
+
+    python -m benchmarks.ann_recall --synthetic 100000 --dim 1536 --queries 500
+    python -m benchmarks.ann_recall --index ./faiss_store --param hnsw.ef_search=128 --param ivf.nprobe=32
+
+recall@k is the share of the exact top k (IndexFlatL2) that each index
+returns; latency is measured one query at a time, as the retriever searches.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+import faiss
+import numpy as np
+from benchmarks.replay import RESULTS_DIR, distribution, git_commit
+from src.tools.index_builder import VECTORS_FILE, index_config, load_manifest, read_index
+from src.tools.index_factory import INDEX_TYPES, build_index, index_bytes, parse_param
+
+
+def synthetic(count: int, queries: int, dim: int, clusters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit vectors scattered around random centers, like embeddings of
+    courses on a limited number of topics; queries come from the same centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+
+    def sample(n: int) -> np.ndarray:
+        points = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(count), sample(queries)
+
+
+def stored_vectors(path: str) -> np.ndarray:
+    """Exact vectors of a store written by build_index.py."""
+    index_type, _ = index_config(load_manifest(path))
+    if index_type != "flat":
+        return np.load(os.path.join(path, VECTORS_FILE))
+    index = read_index(path)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    k = exact.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(e)) / k for f, e in zip(found, exact)]))
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int) -> Tuple[np.ndarray, List[float]]:
+    found = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, positions = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[i] = positions[0]
+    return found, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", default=None, help="store whose vectors to use (default: synthetic)")
+    parser.add_argument("--synthetic", type=int, default=100_000, help="synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1536, help="synthetic dimension (Titan embeddings: 1536)")
+    parser.add_argument("--clusters", type=int, default=200, help="synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="comma-separated index types")
+    parser.add_argument("--param", type=parse_param, action="append", default=[], metavar="TYPE.KEY=VALUE",
+                        help="index parameter override, e.g. ivfpq.m=96; repeatable")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads while searching")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if args.index:
+        vectors = stored_vectors(os.path.realpath(args.index))
+        rng = np.random.default_rng(args.seed)
+        # Stored vectors with a little noise, so queries are near but not on catalog chunks.
+        picked = vectors[rng.integers(0, len(vectors), args.queries)]
+        queries = picked + 0.05 * rng.standard_normal(picked.shape).astype("float32")
+        source = args.index
+    else:
+        vectors, queries = synthetic(args.synthetic, args.queries, args.dim, args.clusters, args.seed)
+        source = f"synthetic:{args.synthetic}x{args.dim}/{args.clusters}"
+    queries = queries.astype("float32")
+
+    overrides: Dict[str, Dict[str, Any]] = {}
+    for key, value in args.param:
+        index_type, _, name = key.partition(".")
+        overrides.setdefault(index_type, {})[name] = value
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<8} {'build s':>8} {'MB':>9} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p95 ms':>8}  params")
+    results = []
+    for index_type in args.types.split(","):
+        started = time.perf_counter()
+        index, params = build_index(vectors, index_type, overrides.get(index_type))
+        build_seconds = time.perf_counter() - started
+
+        faiss.omp_set_num_threads(args.threads)
+        found, latencies = measure(index, queries, args.k)
+        faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+        result = {
+            "type": index_type,
+            "params": params,
+            "build_seconds": round(build_seconds, 3),
+            "index_mb": round(index_bytes(index) / 2 ** 20, 2),
+            "recall": round(recall(found, truth), 4),
+            "latency_ms": distribution(latencies, 3),
+        }
+        results.append(result)
+        print(f"{index_type:<8} {result['build_seconds']:>8} {result['index_mb']:>9} {result['recall']:>10} "
+              f"{result['latency_ms']['p50']:>8} {result['latency_ms']['p95']:>8}  {params}")
+
+    output = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {"source": source, "vectors": len(vectors), "dim": int(vectors.shape[1]),
+                   "queries": len(queries), "k": args.k, "threads": args.threads},
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"ann-{datetime.datetime.now():%Y%m%d-%H%M%S}-{output['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Per-turn overhead of the conversation graph as the history grows.
+
+The course agent is replaced by one that answers instantly and the models use
+the stub backend, so the timings are the graph's own bookkeeping: running the
+nodes, reducing their updates into the state and checkpointing the session.
+
+    python -m benchmarks.graph_overhead --turns 500
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("MODEL_BACKEND", "stub")
+
+from langchain_core.messages import HumanMessage
+from src.agent.graph import create_course_recommender_graph
+from src.utils.session_store import SessionStore, create_checkpointer
+
+
+class InstantAgent:
+    """Stands in for CourseRecommenderAgent with a constant-time reply."""
+
+    def process_message(self, state):
+        return {"response": "That sounds fun! What else do you enjoy doing?"}
+
+    async def aprocess_message(self, state):
+        return self.process_message(state)
+
+
+def run(turns: int, bucket: int, backend: str):
+    graph = create_course_recommender_graph(InstantAgent(), checkpointer=create_checkpointer(backend))
+    sessions = SessionStore(graph)
+    config = sessions.config("benchmark")
+    sessions.update("benchmark", {"grade": 10})
+
+    timings = []
+    for turn in range(turns):
+        started = time.perf_counter()
+        graph.invoke({"messages": [HumanMessage(content=f"ok, tell me more ({turn})")]}, config)
+        timings.append(time.perf_counter() - started)
+
+    print(f"{'messages':>16} {'median ms':>10} {'p95 ms':>8}")
+    for start in range(0, turns, bucket):
+        window = sorted(timings[start:start + bucket])
+        p95 = window[min(len(window) - 1, int(len(window) * 0.95))]
+        print(f"{start * 2:>7} - {(start + len(window)) * 2:<6} {statistics.median(window) * 1000:>10.2f} {p95 * 1000:>8.2f}")
+    print(f"total messages: {len(sessions.load('benchmark')['messages'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--bucket", type=int, default=50, help="turns per reported row")
+    parser.add_argument("--backend", default="memory", choices=["memory", "sqlite"])
+    args = parser.parse_args()
+    run(args.turns, args.bucket, args.backend)
@@ -0,0 +1,303 @@
+"""Concurrent HTTP load test: many independent students chatting at once.
+
+Every simulated student runs whole sessions, one after another:
+/set_grade, the turns of one scripted conversation as /chat requests, then
+/get_chat_history. Concurrency is stepped through the given levels. Each
+level reports throughput, latency percentiles per endpoint, the error rate
+and the server's peak RSS, so the point where throughput stops growing
+shows up directly.
+
+By default the server is started on the stub backend over a stub-built
+index (Flask's threaded server, or hypercorn with --server async):
+
+    python -m benchmarks.load_test --concurrency 1,10,50,100,200 --duration 20 --latency-ms 300
+
+or aimed at a running server (RSS is reported if --server-pid is given):
+
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --server-pid 1234
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+from benchmarks.replay import RESULTS_DIR, SCRIPTS, distribution, git_commit
+
+ENDPOINTS = ("/set_grade", "/chat", "/get_chat_history")
+
+
+class Student(threading.Thread):
+    """One simulated student on its own keep-alive connection and cookie jar."""
+
+    def __init__(self, host: str, port: int, scripts: List[Dict[str, Any]], stop: threading.Event,
+                 think: float, timeout: float, seed: int):
+        super().__init__(daemon=True)
+        self.host, self.port, self.timeout = host, port, timeout
+        self.scripts = scripts
+        self.stop = stop
+        self.think = think
+        self.random = random.Random(seed)
+        self.samples: List[tuple] = []  # (endpoint, seconds, ok)
+        self.sessions = 0
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._cookies: Dict[str, str] = {}
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> bool:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if self._cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self._cookies.items())
+        started = time.perf_counter()
+        ok = False
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self._connection.getresponse()
+            response.read()
+            for header in response.headers.get_all("Set-Cookie") or []:
+                name, _, value = header.split(";", 1)[0].partition("=")
+                self._cookies[name.strip()] = value.strip()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request.
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+        self.samples.append((path, time.perf_counter() - started, ok))
+        return ok
+
+    def run(self):
+        while not self.stop.is_set():
+            script = self.random.choice(self.scripts)
+            self._cookies = {}  # a new student, with a new session cookie
+            if not self.request("POST", "/set_grade", {"grade": script["grade"]}):
+                continue
+            for message in script["turns"]:
+                if self.stop.is_set():
+                    return
+                body = {"message": message}
+                if script.get("credit_type"):
+                    body["credit_type"] = script["credit_type"]
+                self.request("POST", "/chat", body)
+                if self.think:
+                    time.sleep(self.think * self.random.uniform(0.5, 1.5))
+            self.request("GET", "/get_chat_history")
+            self.sessions += 1
+
+
+def process_rss(pid: int) -> int:
+    """Resident set size in bytes of pid and all its descendants (Linux /proc)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+        pending.extend(children.get(current, []))
+    return total
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid, self.interval = pid, interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while self.pid and not self._done.is_set():
+            self.peak = max(self.peak, process_rss(self.pid))
+            self._done.wait(self.interval)
+
+    def finish(self) -> Optional[float]:
+        self._done.set()
+        self.join()
+        return round(self.peak / 2 ** 20, 1) if self.pid else None
+
+
+def run_level(host: str, port: int, scripts, concurrency: int, duration: float, think: float,
+              timeout: float, server_pid: Optional[int]) -> Dict[str, Any]:
+    stop = threading.Event()
+    students = [Student(host, port, scripts, stop, think, timeout, seed) for seed in range(concurrency)]
+    sampler = RSSSampler(server_pid)
+    sampler.start()
+    started = time.perf_counter()
+    for student in students:
+        student.start()
+    time.sleep(duration)
+    stop.set()
+    for student in students:
+        student.join(timeout + 1)
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for student in students for sample in student.samples]
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "sessions": sum(student.sessions for student in students),
+        "requests_per_second": round(len(samples) / elapsed, 1),
+        "chat_turns_per_second": round(sum(1 for path, _, ok in samples if path == "/chat" and ok) / elapsed, 1),
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "latency_ms": {
+            endpoint: distribution([seconds * 1000 for path, seconds, ok in samples if path == endpoint and ok])
+            for endpoint in ENDPOINTS
+        },
+        "server_rss_mb": sampler.finish(),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind: str, port: int, latency_ms: float, index_path: Optional[str]) -> subprocess.Popen:
+    """The app on the stub backend, waited on until /ready answers 200."""
+    if index_path is None:
+        index_path = os.path.join(tempfile.mkdtemp(prefix="load-"), "faiss_store")
+        subprocess.run(
+            [sys.executable, "build_index.py", "--out", index_path],
+            env={**os.environ, "MODEL_BACKEND": "stub"}, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    env = {
+        **os.environ,
+        "MODEL_BACKEND": "stub",
+        "STUB_LATENCY_MS": str(latency_ms),
+        "COURSE_INDEX_PATH": index_path,
+        "LOG_LEVEL": "WARNING",
+    }
+    if kind == "async":
+        command = [sys.executable, "-m", "hypercorn", "async_app:app", "--bind", f"127.0.0.1:{port}"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads"]
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/ready")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(server)
+    raise RuntimeError("Server did not become ready")
+
+
+def stop_server(server: subprocess.Popen):
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+
+
+def print_level(level: Dict[str, Any]):
+    chat = level["latency_ms"]["/chat"] or {"p50": "-", "p95": "-", "p99": "-"}
+    print(f"{level['concurrency']:>6} {level['requests_per_second']:>8} {level['chat_turns_per_second']:>8} "
+          f"{chat['p50']:>9} {chat['p95']:>9} {chat['p99']:>9} {level['error_rate'] * 100:>7.2f} "
+          f"{level['server_rss_mb'] if level['server_rss_mb'] is not None else '-':>8}")
+
+
+def saturation(levels: List[Dict[str, Any]]) -> Optional[int]:
+    """First concurrency whose throughput is less than 10% above the previous level's."""
+    for previous, level in zip(levels, levels[1:]):
+        if level["requests_per_second"] < previous["requests_per_second"] * 1.1:
+            return level["concurrency"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,10,50,100,200", help="comma-separated student counts")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a student's turns")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--scripts", default=SCRIPTS, help="scripted conversations JSON")
+    parser.add_argument("--url", default=None, help="test a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="pid of that server, for RSS")
+    parser.add_argument("--server", choices=["flask", "async"], default="flask", help="server to start")
+    parser.add_argument("--latency-ms", type=float, default=0, help="stub model delay per call")
+    parser.add_argument("--index", default=None, help="existing index for the started server")
+    parser.add_argument("--out", default=None, help="result file (default: benchmarks/results/load-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    with open(args.scripts) as f:
+        scripts = json.load(f)["conversations"]
+
+    server = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port, server_pid = parsed.hostname, parsed.port or 80, args.server_pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        server = start_server(args.server, port, args.latency_ms, args.index)
+        server_pid = server.pid
+
+    levels = []
+    print(f"{'users':>6} {'req/s':>8} {'turns/s':>8} {'chat p50':>9} {'p95':>9} {'p99':>9} {'errors%':>7} {'RSS MB':>8}")
+    try:
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            level = run_level(host, port, scripts, concurrency, args.duration, args.think_ms / 1000, args.timeout, server_pid)
+            levels.append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "server": args.url or args.server,
+            "duration": args.duration,
+            "think_ms": args.think_ms,
+            "latency_ms": None if args.url else args.latency_ms,
+        },
+        "saturation_concurrency": saturation(levels),
+        "levels": levels,
+    }
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"load-{datetime.datetime.now():%Y%m%d-%H%M%S}-{result['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    if result["saturation_concurrency"]:
+        print(f"throughput stops growing at about {result['saturation_concurrency']} concurrent students")
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Replay scripted student conversations through the graph on fake models.
+
+Every LLM and embedding call goes to the deterministic stub backend with a
+simulated latency, so the numbers are comparable across commits without
+Bedrock. Reports per-turn latency (p50/p95/p99, overall and per stage), LLM
+calls and prompt tokens per turn and memory growth per session, and saves
+them as JSON under benchmarks/results/.
+
+    python -m benchmarks.replay --repeat 5 --latency-ms 300 --per-1k-tokens-ms 100 --jitter 0.2
+    python -m benchmarks.replay --compare benchmarks/results/<earlier run>.json
+
+The retriever, agent and graph are built once, as in the app, so the query
+embedding and recommendation caches warm up over the repeats. The memory
+pass replays every conversation once more under tracemalloc, after the
+timed runs, so tracing does not slow the timings down.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+SCRIPTS = os.path.join(os.path.dirname(__file__), "conversations.json")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Summary values compared by --compare; all of them are better when lower.
+COMPARED = [
+    ("latency_ms", "p50"),
+    ("latency_ms", "p95"),
+    ("latency_ms", "p99"),
+    ("llm_calls_per_turn", None),
+    ("prompt_tokens_per_turn", "p95"),
+    ("prompt_tokens_per_call", "max"),
+    ("session_memory_kb", "mean"),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+
+def distribution(values: List[float], digits: int = 2) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 0.50), digits),
+        "p95": round(percentile(values, 0.95), digits),
+        "p99": round(percentile(values, 0.99), digits),
+        "mean": round(statistics.fmean(values), digits),
+        "max": round(max(values), digits),
+    }
+
+
+def build_graph(index_path: Optional[str]):
+    """The app's retriever, agent and graph on the stub backend, over a stub
+    index built from the catalog unless index_path is given."""
+    from src.agent.course_agent import CourseRecommenderAgent
+    from src.agent.graph import create_course_recommender_graph
+    from src.models.llm_config import EMBEDDING_MODEL_ID
+    from src.models.stub_models import StubEmbeddings
+    from src.tools.course_retriever import CourseRetriever
+    from src.tools.index_builder import IndexBuilder
+    from src.utils.data_loader import stream_course_data
+    from src.utils.session_store import SessionStore, create_checkpointer
+
+    if index_path is None:
+        index_path = os.path.join(tempfile.mkdtemp(prefix="replay-"), "faiss_store")
+        # Built without the simulated latency; only the replay is timed.
+        IndexBuilder(StubEmbeddings(), model_id=f"stub:{EMBEDDING_MODEL_ID}", persist_path=index_path).build(
+            stream_course_data("src/data/courses.json")
+        )
+
+    agent = CourseRecommenderAgent(CourseRetriever(index_path))
+    graph = create_course_recommender_graph(agent, checkpointer=create_checkpointer("memory"))
+    return graph, SessionStore(graph), agent
+
+
+def start_conversation(sessions, script: Dict[str, Any]) -> str:
+    user_id = f"replay-{uuid.uuid4().hex}"
+    profile = {"grade": script["grade"]}
+    if script.get("credit_type"):
+        profile["credit_preference"] = script["credit_type"]
+    sessions.update(user_id, profile)
+    return user_id
+
+
+def turn_record(script: Dict[str, Any], turn: int, seconds: float, trace, result, previous: Optional[str]) -> Dict[str, Any]:
+    recommended = result.get("last_recommendation") != previous
+    calls = [span for span in trace.spans if span["kind"] == "llm"]
+    return {
+        "conversation": script["name"],
+        "turn": turn,
+        "stage": "recommendation" if recommended else result.get("conversation_stage"),
+        "ms": seconds * 1000,
+        "llm_calls": trace.calls,
+        "prompt_tokens": trace.prompt_tokens,
+        "max_prompt_tokens": max((span.get("prompt_tokens", 0) for span in calls), default=0),
+    }
+
+
+def replay(graph, sessions, script: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from langchain_core.messages import HumanMessage
+    from src.utils.tracing import TurnTrace
+
+    user_id = start_conversation(sessions, script)
+    records, previous = [], None
+    for turn, message in enumerate(script["turns"]):
+        trace = TurnTrace(user_id, "replay")
+        config = {**sessions.config(user_id), "callbacks": [trace]}
+        started = time.perf_counter()
+        result = graph.invoke({"messages": [HumanMessage(content=message)]}, config)
+        records.append(turn_record(script, turn, time.perf_counter() - started, trace, result, previous))
+        previous = result.get("last_recommendation")
+    return records
+
+
+async def areplay(graph, sessions, script: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from langchain_core.messages import HumanMessage
+    from src.utils.tracing import TurnTrace
+
+    user_id = start_conversation(sessions, script)
+    records, previous = [], None
+    for turn, message in enumerate(script["turns"]):
+        trace = TurnTrace(user_id, "replay")
+        config = {**sessions.config(user_id), "callbacks": [trace]}
+        started = time.perf_counter()
+        result = await graph.ainvoke({"messages": [HumanMessage(content=message)]}, config)
+        records.append(turn_record(script, turn, time.perf_counter() - started, trace, result, previous))
+        previous = result.get("last_recommendation")
+    return records
+
+
+def run_once(graph, sessions, script: Dict[str, Any], use_async: bool) -> List[Dict[str, Any]]:
+    if use_async:
+        return asyncio.run(areplay(graph, sessions, script))
+    return replay(graph, sessions, script)
+
+
+def session_memory(graph, sessions, scripts: List[Dict[str, Any]], use_async: bool) -> List[float]:
+    """KiB still allocated after each conversation, sessions kept as the app keeps them."""
+    growth = []
+    tracemalloc.start()
+    try:
+        for script in scripts:
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            run_once(graph, sessions, script, use_async)
+            gc.collect()
+            growth.append((tracemalloc.get_traced_memory()[0] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+    return growth
+
+
+def summarize(records: List[Dict[str, Any]], memory: List[float]) -> Dict[str, Any]:
+    by_stage: Dict[str, List[float]] = {}
+    for record in records:
+        by_stage.setdefault(record["stage"] or "none", []).append(record["ms"])
+    return {
+        "turns": len(records),
+        "latency_ms": distribution([record["ms"] for record in records]),
+        "latency_ms_by_stage": {stage: distribution(values) for stage, values in sorted(by_stage.items())},
+        "llm_calls_per_turn": round(statistics.fmean(record["llm_calls"] for record in records), 3),
+        "turns_by_llm_calls": {str(k): v for k, v in sorted(Counter(record["llm_calls"] for record in records).items())},
+        "prompt_tokens_per_turn": distribution([record["prompt_tokens"] for record in records], 0),
+        "prompt_tokens_per_call": distribution([record["max_prompt_tokens"] for record in records if record["llm_calls"]], 0),
+        "session_memory_kb": distribution(memory, 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"{'':<22} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows = [("turn latency ms", summary["latency_ms"])]
+    rows += [(f"  {stage}", values) for stage, values in summary["latency_ms_by_stage"].items()]
+    rows += [
+        ("prompt tokens / turn", summary["prompt_tokens_per_turn"]),
+        ("prompt tokens / call", summary["prompt_tokens_per_call"]),
+        ("session memory KiB", summary["session_memory_kb"]),
+    ]
+    for label, values in rows:
+        if values:
+            print(f"{label:<22} {values['p50']:>9} {values['p95']:>9} {values['p99']:>9} {values['max']:>9}")
+    print(f"LLM calls per turn: {summary['llm_calls_per_turn']} {summary['turns_by_llm_calls']}")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nagainst {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for section, key in COMPARED:
+        old, new = baseline["summary"].get(section), current["summary"].get(section)
+        if key is not None:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        label = f"{section}.{key}" if key else section
+        print(f"  {label:<30} {old:>10} -> {new:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scripts", default=SCRIPTS, help="scripted conversations JSON")
+    parser.add_argument("--repeat", type=int, default=3, help="times every conversation is replayed")
+    parser.add_argument("--latency-ms", type=float, default=0, help="fixed delay per model call")
+    parser.add_argument("--per-1k-tokens-ms", type=float, default=0, help="extra LLM delay per 1000 prompt tokens")
+    parser.add_argument("--jitter", type=float, default=0, help="deterministic +/- spread of delays, as a fraction")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="replay with ainvoke")
+    parser.add_argument("--agent-mode", choices=["dispatch", "react"], default=None)
+    parser.add_argument("--index", default=None, help="existing stub-built index; by default one is built")
+    parser.add_argument("--out", default=None, help="result file (default: benchmarks/results/replay-<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    # The model clients read these when they are first created.
+    os.environ["MODEL_BACKEND"] = "stub"
+    os.environ["STUB_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["STUB_LATENCY_PER_1K_TOKENS_MS"] = str(args.per_1k_tokens_ms)
+    os.environ["STUB_JITTER"] = str(args.jitter)
+    os.environ.pop("QUERY_EMBEDDING_CACHE_PATH", None)
+    if args.agent_mode:
+        os.environ["AGENT_MODE"] = args.agent_mode
+
+    with open(args.scripts) as f:
+        scripts = json.load(f)
+
+    from src.models.llm_config import get_llm
+    llm = get_llm()
+    getattr(llm, "model", llm).replies = scripts.get("replies", [])  # the stub, inside the single-flight wrapper
+    graph, sessions, agent = build_graph(args.index)
+
+    records = []
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for script in scripts["conversations"]:
+            records.extend(run_once(graph, sessions, script, args.use_async))
+    elapsed = time.perf_counter() - started
+    memory = session_memory(graph, sessions, scripts["conversations"], args.use_async)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "scripts": os.path.relpath(args.scripts),
+            "repeat": args.repeat,
+            "latency_ms": args.latency_ms,
+            "per_1k_tokens_ms": args.per_1k_tokens_ms,
+            "jitter": args.jitter,
+            "async": args.use_async,
+            "agent_mode": agent.mode,
+        },
+        "wall_seconds": round(elapsed, 3),
+        "summary": summarize(records, memory),
+        "turns": [{**record, "ms": round(record["ms"], 3)} for record in records],
+    }
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"replay-{datetime.datetime.now():%Y%m%d-%H%M%S}-{result['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print_summary(result["summary"])
+    print(f"{len(records)} turns in {elapsed:.2f}s; saved {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Build the course FAISS index offline; the web app only loads it.
+
+    python build_index.py --catalog src/data/courses.json --workers 8 --rate 20
+
+The catalog may be a JSON array or JSON Lines; it is streamed, so memory
+does not grow with its size.
+
+Only courses added or changed since the last build are embedded unless
+--full is given. Running apps pick up the new index on POST /refresh_index.
+Large catalogs can use an approximate index, e.g.
+
+    python build_index.py --index-type ivfpq --index-param nlist=1024 --index-param m=64
+
+or skip chunking and embed one vector per course with --granularity course.
+"""
+import argparse
+import json
+import logging
+from src.models.llm_config import EMBEDDING_MODEL_ID, MODEL_BACKEND, get_embeddings
+from src.tools.index_builder import GRANULARITIES, IndexBuilder
+from src.tools.index_factory import DEFAULT_PARAMS, INDEX_TYPES, parse_param
+from src.utils.data_loader import CatalogStats, stream_course_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog", default="src/data/courses.json", help="course catalog JSON")
+    parser.add_argument("--out", default="./faiss_store", help="index directory (a symlink to the latest build)")
+    parser.add_argument("--batch-size", type=int, default=32, help="chunks per embedding call")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent embedding calls")
+    parser.add_argument("--rate", type=float, default=None, help="max embedding calls per second")
+    parser.add_argument("--retries", type=int, default=5, help="retries per failed embedding call")
+    parser.add_argument("--full", action="store_true", help="re-embed every course")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES, help="FAISS index to build")
+    parser.add_argument(
+        "--index-param", type=parse_param, action="append", default=[], metavar="KEY=VALUE",
+        help="index parameter, repeatable; " + "; ".join(
+            f"{name}: {', '.join(params) or '-'}" for name, params in DEFAULT_PARAMS.items()
+        )
+    )
+    parser.add_argument("--granularity", default="chunk", choices=GRANULARITIES,
+                        help="embed description chunks, or one vector per course")
+    args = parser.parse_args()
+
+    builder = IndexBuilder(
+        get_embeddings(),
+        model_id=f"{MODEL_BACKEND}:{EMBEDDING_MODEL_ID}",
+        persist_path=args.out,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        requests_per_second=args.rate,
+        max_retries=args.retries,
+        index_type=args.index_type,
+        index_params=dict(args.index_param),
+        granularity=args.granularity
+    )
+    catalog = CatalogStats()
+    stats = builder.build(stream_course_data(args.catalog, catalog), full=args.full)
+    stats["invalid_items"] = catalog.skipped
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    main()
@@ -1,29 +1,57 @@
+import logging
+import os
 from typing import Dict, Any, List
 from langchain.tools import Tool
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langgraph.prebuilt import create_react_agent
-from src.models.llm_config import get_llm
+from src.models.llm_config import get_llm, USER_FACING_TAG
 from src.tools.course_retriever import CourseRetriever
 from src.tools.interest_extractor import extract_interests
-from src.tools.conversation_manager import generate_discovery_response, generate_course_recommendation
+from src.tools.conversation_manager import (
+    generate_discovery_response,
+    generate_course_recommendation,
+    agenerate_discovery_response,
+    agenerate_course_recommendation
+)
 from src.schema.state import CourseRecommenderState
+from src.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "512"))
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600"))
+# "dispatch" calls the tool for the current conversation stage directly;
+# "react" lets the ReAct agent pick tools, at the cost of extra LLM round trips.
+AGENT_MODE = os.getenv("AGENT_MODE", "dispatch").lower()
+
+def recommendation_query(state: Dict[str, Any]) -> str:
+    """Search text for a recommendation: the interests, comma separated so the
+    retriever can match each one. Grade and credit type are applied as filters."""
+    return f"courses about {', '.join(state['interests'])}"
+
 
 class CourseRecommenderAgent:
-    """ReAct agent for course recommendations."""
+    """Course recommendation agent: direct stage-based tool dispatch, or a ReAct agent."""
     
-    def __init__(self, course_retriever: CourseRetriever):
+    def __init__(self, course_retriever: CourseRetriever, mode: str = AGENT_MODE):
+        if mode not in ("dispatch", "react"):
+            raise ValueError(f"Unknown agent mode: {mode}")
+        self.mode = mode
         self.llm = get_llm()
         self.course_retriever = course_retriever
+        self.recommendation_cache = TTLCache(RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL)
+        course_retriever.on_reload(self.recommendation_cache.clear)
         self.tools = self._create_tools()
-        self.agent = self._create_agent()
+        self._tools_by_name = {t.name: t for t in self.tools}
+        self.agent = self._create_agent() if mode == "react" else None
     
     def _create_tools(self) -> List[Tool]:
         """Create tools for the agent."""
         
-        def retrieve_courses_tool(query: str) -> str:
+        def retrieve_courses_tool(query: str, grade: int = None, credit_preference: str = None) -> str:
             """Retrieve relevant courses."""
-            docs = self.course_retriever.search_courses(query)
+            docs = self.course_retriever.search_courses(query, grade=grade, credit_preference=credit_preference)
             return "\n\n".join([doc.page_content for doc in docs])
         
         def extract_interests_tool(state: Dict[str, Any]) -> str:
@@ -32,38 +60,87 @@ class CourseRecommenderAgent:
                 interests = extract_interests.invoke(messages=state["messages"])
                 return f"Extracted interests: {', '.join(interests) if interests else 'none'}"
             except Exception as e:
-                print(f"[ERROR] extract_interests_tool: {e}")
+                logger.error(f"extract_interests_tool: {e}")
                 return "Failed to extract interests."
         
         def discovery_response_tool(state: Dict[str, Any]) -> str:
             """Generate discovery conversation response."""
             return generate_discovery_response.invoke({
-                "messages": state["messages"],
+                "messages": state["messages"][state.get("summary_watermark", 0):],
                 "grade": state["grade"],
-                "interests": state["interests"]
+                "interests": state["interests"],
+                "summary": state.get("summary", "")
             })
         
         def recommendation_tool(state: Dict[str, Any]) -> str:
             """Generate course recommendations."""
-            query = f"courses for grade {state['grade']} interested in {', '.join(state['interests'])}"
-            course_context = retrieve_courses_tool(query)
+            cache_key = self._recommendation_cache_key(state)
+            cached = self.recommendation_cache.get(cache_key)
+            if cached is not None:
+                return cached["recommendation"]
+
+            query = recommendation_query(state)
+            course_context = retrieve_courses_tool(query, state["grade"], state.get("credit_preference", "any"))
 
             if not course_context.strip():
                 return "I couldn’t find any matching courses right now, but we can keep chatting to explore more of your interests!"
 
-            return generate_course_recommendation.invoke({
+            recommendation = generate_course_recommendation.invoke({
                 "query": state["messages"][-1].content if state["messages"] else "",
                 "grade": state["grade"],
                 "interests": state["interests"],
                 "credit_preference": state.get("credit_preference", "any"),
                 "course_context": course_context
             })
+            self.recommendation_cache.set(cache_key, {
+                "course_context": course_context,
+                "recommendation": recommendation
+            })
+            return recommendation
+
+        async def aretrieve_courses_tool(query: str, grade: int = None, credit_preference: str = None) -> str:
+            docs = await self.course_retriever.asearch_courses(query, grade=grade, credit_preference=credit_preference)
+            return "\n\n".join([doc.page_content for doc in docs])
+
+        async def adiscovery_response_tool(state: Dict[str, Any]) -> str:
+            return await agenerate_discovery_response(
+                state["messages"][state.get("summary_watermark", 0):],
+                state["grade"],
+                state["interests"],
+                state.get("summary", "")
+            )
+
+        async def arecommendation_tool(state: Dict[str, Any]) -> str:
+            cache_key = self._recommendation_cache_key(state)
+            cached = self.recommendation_cache.get(cache_key)
+            if cached is not None:
+                return cached["recommendation"]
+
+            query = recommendation_query(state)
+            course_context = await aretrieve_courses_tool(query, state["grade"], state.get("credit_preference", "any"))
+
+            if not course_context.strip():
+                return "I couldn’t find any matching courses right now, but we can keep chatting to explore more of your interests!"
+
+            recommendation = await agenerate_course_recommendation(
+                query=state["messages"][-1].content if state["messages"] else "",
+                grade=state["grade"],
+                interests=state["interests"],
+                credit_preference=state.get("credit_preference", "any"),
+                course_context=course_context
+            )
+            self.recommendation_cache.set(cache_key, {
+                "course_context": course_context,
+                "recommendation": recommendation
+            })
+            return recommendation
         
         return [
             Tool(
                 name="retrieve_courses",
                 description="Retrieve relevant courses based on a search query",
-                func=retrieve_courses_tool
+                func=retrieve_courses_tool,
+                coroutine=aretrieve_courses_tool
             ),
             Tool(
                 name="extract_interests",
@@ -73,15 +150,28 @@ class CourseRecommenderAgent:
             Tool(
                 name="discovery_response",
                 description="Generate a conversational response to discover student interests",
-                func=discovery_response_tool
+                func=discovery_response_tool,
+                coroutine=adiscovery_response_tool
             ),
             Tool(
                 name="course_recommendation",
                 description="Generate course recommendations based on student profile",
-                func=recommendation_tool
+                func=recommendation_tool,
+                coroutine=arecommendation_tool
             )
         ]
     
+    def _recommendation_cache_key(self, state: Dict[str, Any]) -> tuple:
+        """Key on the student profile and the version of the index being
+        served; reloading the index empties the cache."""
+        self.course_retriever.reload_if_stale()
+        return (
+            state.get("grade"),
+            tuple(sorted({interest.lower() for interest in state.get("interests", [])})),
+            (state.get("credit_preference") or "any").lower(),
+            self.course_retriever.loaded_version
+        )
+
     def _create_agent(self):
         """Create the ReAct agent with a custom system message."""
         system_message_a = """
@@ -116,30 +206,79 @@ class CourseRecommenderAgent:
         return create_react_agent(
             self.llm,
             self.tools,
-            prompt=prompt 
+            prompt=prompt,
+            # One-shot helper inside a graph node; don't checkpoint its steps
+            # into the session checkpointer.
+            checkpointer=False
         )
         
+    def _stage_tool(self, state: CourseRecommenderState) -> Tool:
+        """The tool the conversation stage calls for; the graph already decided the stage."""
+        if state.get("conversation_stage") == "recommendation":
+            return self._tools_by_name["course_recommendation"]
+        return self._tools_by_name["discovery_response"]
+
     def process_message(self, state: CourseRecommenderState) -> Dict[str, Any]:
         """Process a message through the agent and return response and updated state."""
+        if self.mode == "dispatch":
+            try:
+                return {"response": self._stage_tool(state).func(state), "updated_state": state}
+            except Exception as e:
+                logger.error(f"Error in tool dispatch: {e}")
+                return self._agent_error(state)
+
         try:
-            result = self.agent.invoke(state)
+            result = self.agent.invoke(self._agent_input(state), config={"tags": [USER_FACING_TAG]})
+            return self._agent_output(state, result)
 
-            response = "Hmm, it seems quiet. Want to tell me about your favorite way to relax or have fun?"
-            if isinstance(result, dict) and "messages" in result and result["messages"]:
-                last_message = result["messages"][-1]
-                response = getattr(last_message, "content", None)
-                if not response:
-                    response = str(last_message)
+        except Exception as e:
+            logger.error(f"Error in agent processing: {e}")
+            return self._agent_error(state)
+
+    async def aprocess_message(self, state: CourseRecommenderState) -> Dict[str, Any]:
+        """Async version of process_message."""
+        if self.mode == "dispatch":
+            try:
+                return {"response": await self._stage_tool(state).coroutine(state), "updated_state": state}
+            except Exception as e:
+                logger.error(f"Error in async tool dispatch: {e}")
+                return self._agent_error(state)
 
-            return {
-                "response": response,
-                "updated_state": result if isinstance(result, dict) else state
-            }
+        try:
+            result = await self.agent.ainvoke(self._agent_input(state), config={"tags": [USER_FACING_TAG]})
+            return self._agent_output(state, result)
 
         except Exception as e:
-            print(f"[ERROR] Error in agent processing: {e}")
-            return {
-                "response": "I'm having a moment of confusion. Could you tell me what subjects or activities you enjoy?",
-                "updated_state": state
-            }
+            logger.error(f"Error in async agent processing: {e}")
+            return self._agent_error(state)
+
+    @staticmethod
+    def _agent_input(state: CourseRecommenderState) -> Dict[str, Any]:
+        """Summary plus the turns not yet folded into it, instead of the whole
+        conversation."""
+        messages = state.get("messages", [])[state.get("summary_watermark", 0):]
+        if state.get("summary"):
+            # Directly follows the system prompt, so Bedrock merges the two.
+            messages = [SystemMessage(content=f"Summary of the earlier conversation: {state['summary']}")] + messages
+        return {"messages": messages}
+
+    @staticmethod
+    def _agent_output(state: CourseRecommenderState, result: Any) -> Dict[str, Any]:
+        response = "Hmm, it seems quiet. Want to tell me about your favorite way to relax or have fun?"
+        if isinstance(result, dict) and "messages" in result and result["messages"]:
+            last_message = result["messages"][-1]
+            response = getattr(last_message, "content", None)
+            if not response:
+                response = str(last_message)
+
+        return {
+            "response": response,
+            "updated_state": result if isinstance(result, dict) else state
+        }
 
+    @staticmethod
+    def _agent_error(state: CourseRecommenderState) -> Dict[str, Any]:
+        return {
+            "response": "I'm having a moment of confusion. Could you tell me what subjects or activities you enjoy?",
+            "updated_state": state
+        }
@@ -1,13 +1,23 @@
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, Optional
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 from src.schema.state import CourseRecommenderState
 from src.agent.course_agent import CourseRecommenderAgent
-from src.tools.interest_extractor import extract_interests
+from src.tools.interest_extractor import extract_interests, aextract_interests
+from src.tools.conversation_summarizer import summarize_conversation, asummarize_conversation
+from src.utils.message_filters import HISTORY_TOKEN_BUDGET, SUMMARY_KEEP_TOKENS, history_window, message_tokens
+from src.utils.interest_gate import interest_gate
 
+logger = logging.getLogger(__name__)
 
-def create_course_recommender_graph(course_agent: CourseRecommenderAgent) -> StateGraph:
+
+def create_course_recommender_graph(
+    course_agent: CourseRecommenderAgent,
+    checkpointer: Optional[BaseCheckpointSaver] = None
+) -> StateGraph:
     def process_user_input(state: CourseRecommenderState) -> Dict[str, Any]:
         messages = state.get("messages", [])
         last_message = messages[-1].content.lower() if messages and isinstance(messages[-1], HumanMessage) else ""
@@ -17,104 +27,174 @@ def create_course_recommender_graph(course_agent: CourseRecommenderAgent) -> Sta
         stage = state.get("conversation_stage")
 
         if any(exit_phrase in last_message for exit_phrase in ["bye", "exit", "quit", "stop", "no thanks", "goodbye"]):
-            return {**state, "conversation_stage": "complete"}
+            return {"conversation_stage": "complete"}
     
         if stage == "complete" and last_message:
-            return {**state, "conversation_stage": "discovery", "interest_turns": 0}
+            return {"conversation_stage": "discovery", "interest_turns": 0}
 
         if stage == "prompt_recommendation":
             if any(affirm in last_message for affirm in ["yes", "yeah", "sure", "of course", "please",'yes if you have', 'yes for sure', 'ok go ahead','yes please','yep']):
-                return {**state, "conversation_stage": "recommendation"}
+                return {"conversation_stage": "recommendation"}
             elif any(neg in last_message for neg in ["no", "not really", "maybe later",'not right now']):
-                return {**state, "conversation_stage": "discovery"}
+                return {"conversation_stage": "discovery"}
             else:
-                return state
+                return {}
 
         if interests and len(interests) >= 2:
             if not state.get("has_prompted_recommendation", False):
-                return {**state, "conversation_stage": "prompt_recommendation"}
-            return {**state, "conversation_stage": "recommendation"}
+                return {"conversation_stage": "prompt_recommendation"}
+            return {"conversation_stage": "recommendation"}
 
         if interest_turns >= 3:
-            return {**state, "conversation_stage": "prompt_recommendation"}
+            return {"conversation_stage": "prompt_recommendation"}
+
+        return {"conversation_stage": "discovery"}
 
-        return {**state, "conversation_stage": "discovery"}
 
+    def pending_interest_messages(state: CourseRecommenderState):
+        """Student messages after the watermark, or None when extraction can be skipped."""
+        messages = state.get("messages", [])
+        watermark = state.get("interest_watermark", 0)
+        new_messages = [msg for msg in messages[watermark:] if isinstance(msg, HumanMessage)]
+        if not new_messages or not interest_gate.should_extract(" ".join(msg.content for msg in new_messages)):
+            return None
+        return new_messages
+
+    def merge_interests(state: CourseRecommenderState, new_interests: Any) -> Dict[str, Any]:
+        if not isinstance(new_interests, list):
+            logger.warning("extract_interests returned non-list result. Skipping update.")
+            return {}
+        # reduce_interests merges these into the existing interests.
+        return {"interests": new_interests, "interest_watermark": len(state.get("messages", []))}
 
     def extract_user_interests(state: CourseRecommenderState) -> Dict[str, Any]:
         try:
-            messages = state.get("messages", [])
-            new_interests = extract_interests.invoke({"messages": messages})
-            if not isinstance(new_interests, list):
-                print("[WARN] extract_interests returned non-list result. Skipping update.")
-                return state
-            current_interests = state.get("interests", [])
-            all_interests = list(dict.fromkeys(current_interests + new_interests))
-            return {**state, "interests": all_interests}
+            new_messages = pending_interest_messages(state)
+            if new_messages is None:
+                return {"interest_watermark": len(state.get("messages", []))}
+            return merge_interests(state, extract_interests.invoke({"messages": new_messages}))
+        except Exception as e:
+            # The watermark stays put, so the next turn retries these messages.
+            logger.error(f"Failed to extract user interests: {e}")
+            return {}
+
+    async def aextract_user_interests(state: CourseRecommenderState) -> Dict[str, Any]:
+        try:
+            new_messages = pending_interest_messages(state)
+            if new_messages is None:
+                return {"interest_watermark": len(state.get("messages", []))}
+            return merge_interests(state, await aextract_interests(new_messages))
         except Exception as e:
-            print(f"[ERROR] Failed to extract user interests: {e}")
-            return state
+            # The watermark stays put, so the next turn retries these messages.
+            logger.error(f"Failed to extract user interests: {e}")
+            return {}
+
+    def recommendation_prompt_update(state: CourseRecommenderState) -> Dict[str, Any]:
+        prompt = f"Would you like me to recommend some courses related to {', '.join(state.get('interests', []))}?"
+        return {
+            "messages": [AIMessage(content=prompt)],
+            "has_prompted_recommendation": True
+        }
+
+    def response_update(state: CourseRecommenderState, result: Dict[str, Any]) -> Dict[str, Any]:
+        stage = state.get("conversation_stage")
+        response = result.get("response", "").strip() or "Could you tell me more about what you like?"
+
+        interest_turns = state.get("interest_turns", 0)
+        if stage == "discovery":
+            interest_turns += 1
+
+        update = {
+            "messages": [AIMessage(content=response)],
+            "interest_turns": interest_turns
+        }
+
+        if stage == "recommendation":
+            update.update({
+                "last_recommendation": response,
+                "has_offered_recommendation": True,
+                "conversation_stage": "complete"
+            })
+
+        logger.debug(f"Stage before update: {stage}; interests: {state.get('interests')}")
+        return update
+
+    def fallback_update(state: CourseRecommenderState, error: Exception) -> Dict[str, Any]:
+        logger.error(f"Response generation failed: {error}")
+        fallback = "Hmm, I'm still getting to know you. What else do you enjoy?"
+        return {"messages": [AIMessage(content=fallback)]}
 
     def generate_response(state: CourseRecommenderState) -> Dict[str, Any]:
         try:
-            stage = state.get("conversation_stage")
-            messages = state.get("messages", [])
-
-            if stage == "prompt_recommendation":
-                prompt = f"Would you like me to recommend some courses related to {', '.join(state.get('interests', []))}?"
-                return {
-                    **state,
-                    "messages": messages + [AIMessage(content=prompt)],
-                    "has_prompted_recommendation": True
-                }
-
-            result = course_agent.process_message(state)
-            response = result.get("response", "").strip() or "Could you tell me more about what you like?"
-
-            updated_messages = messages + [AIMessage(content=response)]
-            interest_turns = state.get("interest_turns", 0)
-            if stage == "discovery":
-                interest_turns += 1
-
-            new_state = {
-                **state,
-                "messages": updated_messages,
-                "interest_turns": interest_turns
-            }
-
-            if stage == "recommendation":
-                new_state.update({
-                    "last_recommendation": response,
-                    "has_offered_recommendation": True,
-                    "conversation_stage": "complete"
-                })
-
-            print(f"[DEBUG] Stage before update: {stage}")
-            print(f"[DEBUG] Interests: {state.get('interests')}")
-            return new_state
+            if state.get("conversation_stage") == "prompt_recommendation":
+                return recommendation_prompt_update(state)
+            return response_update(state, course_agent.process_message(state))
+        except Exception as e:
+            return fallback_update(state, e)
 
+    async def agenerate_response(state: CourseRecommenderState) -> Dict[str, Any]:
+        try:
+            if state.get("conversation_stage") == "prompt_recommendation":
+                return recommendation_prompt_update(state)
+            return response_update(state, await course_agent.aprocess_message(state))
         except Exception as e:
-            print(f"[ERROR] Response generation failed: {e}")
-            fallback = "Hmm, I'm still getting to know you. What else do you enjoy?"
-            return {
-                **state,
-                "messages": state.get("messages", []) + [AIMessage(content=fallback)]
-            }
+            return fallback_update(state, e)
+
+    def pending_summary_messages(state: CourseRecommenderState):
+        """Unsummarized messages to fold into the summary, or None while they still fit the prompt window."""
+        unsummarized = state.get("messages", [])[state.get("summary_watermark", 0):]
+        if sum(message_tokens(msg) for msg in unsummarized) <= HISTORY_TOKEN_BUDGET:
+            return None
+        keep = len(history_window(unsummarized, SUMMARY_KEEP_TOKENS))
+        return unsummarized[:len(unsummarized) - keep] or None
+
+    def summarize_history(state: CourseRecommenderState) -> Dict[str, Any]:
+        try:
+            folded = pending_summary_messages(state)
+            if folded is None:
+                return {}
+            summary = summarize_conversation.invoke({"summary": state.get("summary", ""), "messages": folded})
+            return {"summary": summary, "summary_watermark": state.get("summary_watermark", 0) + len(folded)}
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation: {e}")
+            return {}
+
+    async def asummarize_history(state: CourseRecommenderState) -> Dict[str, Any]:
+        try:
+            folded = pending_summary_messages(state)
+            if folded is None:
+                return {}
+            summary = await asummarize_conversation(state.get("summary", ""), folded)
+            return {"summary": summary, "summary_watermark": state.get("summary_watermark", 0) + len(folded)}
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation: {e}")
+            return {}
+
+    def route_after_input(state: CourseRecommenderState):
+        if state.get("conversation_stage") == "discovery":
+            return ["extract_interests", "generate_response"]
+        return "extract_interests"
 
-    def should_continue(state: CourseRecommenderState) -> str:
-        return "complete"
+    def route_after_extraction(state: CourseRecommenderState):
+        return [] if state.get("conversation_stage") == "discovery" else "generate_response"
 
     workflow = StateGraph(CourseRecommenderState)
     workflow.add_node("process_input", process_user_input)
-    workflow.add_node("extract_interests", extract_user_interests)
-    workflow.add_node("generate_response", generate_response)
+    # Each node pairs a sync and an async implementation, so the same graph
+    # serves both invoke() and ainvoke().
+    workflow.add_node("extract_interests", RunnableLambda(extract_user_interests, afunc=aextract_user_interests))
+    workflow.add_node("generate_response", RunnableLambda(generate_response, afunc=agenerate_response))
+    # Joins both branches and runs after the reply, so streamed tokens are not
+    # held up by it.
+    workflow.add_node("summarize_history", RunnableLambda(summarize_history, afunc=asummarize_history))
 
     workflow.set_entry_point("process_input")
-    workflow.add_edge("process_input", "extract_interests")
-    workflow.add_edge("extract_interests", "generate_response")
-    workflow.add_conditional_edges("generate_response", should_continue, {
-        "continue": "process_input",
-        "complete": END
-    })
-
-    return workflow.compile()
+    # A discovery reply does not use the interests, so it runs in parallel
+    # with this turn's extraction. Recommendation prompts and replies name
+    # the interests, so there extraction runs first.
+    workflow.add_conditional_edges("process_input", route_after_input, ["extract_interests", "generate_response"])
+    workflow.add_conditional_edges("extract_interests", route_after_extraction, ["generate_response"])
+    workflow.add_edge(["extract_interests", "generate_response"], "summarize_history")
+    workflow.add_edge("summarize_history", END)
+
+    return workflow.compile(checkpointer=checkpointer)
@@ -0,0 +1,24 @@
+from langchain.prompts import ChatPromptTemplate
+
+conversation_summary_prompt = ChatPromptTemplate.from_template("""
+You are keeping running notes on a conversation between a student and an educational counselor chatbot.
+
+Current notes:
+
+{summary}
+
+Older part of the conversation to fold into the notes:
+
+{chat_history}
+
+Instructions:
+1. Merge the new exchanges into the current notes
+2. Keep the student's grade, interests, dislikes, goals and any course preferences
+3. Keep which courses were already recommended and how the student reacted
+4. Drop greetings, small talk and anything the notes already say
+
+Output Format:
+- Plain text, at most 120 words
+- Write about the student in the third person
+- If the notes are empty and nothing is worth keeping, respond with exactly: "Nothing notable yet."
+""")
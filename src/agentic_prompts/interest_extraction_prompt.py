@@ -3,12 +3,12 @@ from langchain.prompts import ChatPromptTemplate
 extract_interest_prompt = ChatPromptTemplate.from_template("""
 You are an interest extraction system. Your task is to analyze student conversation data and identify clear academic or personal interests that can be used for educational course recommendations.
 
-Here is the full conversation so far:
+Here are the student's new messages since the last analysis:
 
 {chat_history}
 
 Analysis Instructions:
-1. Scan through all student messages in the conversation history
+1. Scan through all of these student messages
 2. Identify interests that are explicitly mentioned or strongly implied through positive language
 3. Focus on extractable interests that could map to educational courses or learning opportunities
 4. Ignore casual mentions or negative statements about topics
@@ -23,8 +23,8 @@ Extract interests in these categories:
 
 Quality criteria for extraction:
 - Only include interests mentioned with enthusiasm or positive sentiment
-- Prioritize interests mentioned multiple times or elaborated upon
-- Exclude topics mentioned only once in passing
+- Prioritize interests that are elaborated upon
+- Exclude topics mentioned only in passing
 - Exclude subjects mentioned negatively (e.g., "I hate math")
 
 Output Format:
@@ -0,0 +1,113 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# The apps import this module first, so .env is loaded here before the
+# settings below are read.
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Warm the components in the background as soon as the app is created.
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1").lower() not in ("0", "false", "no")
+WARMUP_QUERY = "science and technology courses"
+# Written by build_index.py; the app only loads it.
+COURSE_INDEX_PATH = os.getenv("COURSE_INDEX_PATH", "./faiss_store")
+
+
+class Components:
+    """Retriever, agent, graph and session store, built on first use.
+
+    Importing the app stays cheap; warmup() builds everything up front, opens
+    the Bedrock connections and runs one retrieval so the first student does
+    not pay for cold clients. readiness() reports whether that has happened.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built: Dict[str, Any] = {}
+        self._warmup_pid: Optional[int] = None
+        self.warm = False
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        component = self._built.get(name)
+        if component is None:
+            with self._lock:
+                component = self._built.get(name)
+                if component is None:
+                    started = time.perf_counter()
+                    component = factory()
+                    self._built[name] = component
+                    logger.info(f"Built {name} in {time.perf_counter() - started:.2f}s")
+        return component
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The component if it has been built, without building it."""
+        return self._built.get(name)
+
+    @property
+    def retriever(self):
+        from src.tools.course_retriever import CourseRetriever
+        return self._get("retriever", lambda: CourseRetriever(COURSE_INDEX_PATH))
+
+    @property
+    def agent(self):
+        from src.agent.course_agent import CourseRecommenderAgent
+        return self._get("agent", lambda: CourseRecommenderAgent(self.retriever))
+
+    @property
+    def graph(self):
+        from src.agent.graph import create_course_recommender_graph
+        from src.utils.session_store import create_checkpointer
+        return self._get("graph", lambda: create_course_recommender_graph(self.agent, checkpointer=create_checkpointer()))
+
+    @property
+    def sessions(self):
+        from src.utils.session_store import SessionStore
+        return self._get("sessions", lambda: SessionStore(self.graph))
+
+    def warmup(self):
+        """Build every component, connect the model clients and run one retrieval."""
+        started = time.perf_counter()
+        try:
+            from src.models.llm_config import get_llm
+
+            get_llm()
+            self.sessions
+            # Embeds one query, which also opens the pooled Bedrock connection
+            # that the chat model shares.
+            self.retriever.search_courses(WARMUP_QUERY)
+            self.warm = True
+            self.warmup_error = None
+            self.warmup_seconds = round(time.perf_counter() - started, 3)
+            logger.info(f"Warmup finished in {self.warmup_seconds}s")
+        except Exception as e:
+            self.warmup_error = str(e)
+            logger.error(f"Warmup failed: {e}")
+
+    def start_warmup(self):
+        """Warm up in a background thread, once per process (workers forked
+        after the app was created start their own); a failed warmup is retried."""
+        with self._lock:
+            running = self._warmup_pid == os.getpid() and self.warmup_error is None
+            if self.warm or running:
+                return
+            self._warmup_pid = os.getpid()
+            self.warmup_error = None
+        threading.Thread(target=self.warmup, name="warmup", daemon=True).start()
+
+    def readiness(self) -> Dict[str, Any]:
+        return {
+            "ready": self.warm,
+            "retriever": "retriever" in self._built,
+            "graph": "graph" in self._built,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.warmup_error
+        }
+
+
+components = Components()
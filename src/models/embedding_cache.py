@@ -0,0 +1,142 @@
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from src.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an embeddings client with an in-memory LRU and an optional SQLite
+    cache for query embeddings. Concurrent misses for the same query share
+    one embedding call. Document embeddings pass straight through."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        max_entries: int = 1024,
+        disk_path: Optional[str] = None,
+        max_disk_entries: int = 100_000
+    ):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.flights = SingleFlight("query_embedding")
+
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model_id TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model_id, query))"
+            )
+            self._disk.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        query = normalize_query(text)
+        vector = self._lookup(query)
+        if vector is not None:
+            return vector
+
+        vector, _ = self.flights.do(query, lambda: self._embed(query))
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        query = normalize_query(text)
+        vector = self._lookup(query)
+        if vector is not None:
+            return vector
+
+        vector, _ = await self.flights.ado(query, lambda: self._aembed(query))
+        return vector
+
+    def _embed(self, query: str) -> List[float]:
+        vector = self.embeddings.embed_query(query)
+        self._store(query, vector)
+        return vector
+
+    async def _aembed(self, query: str) -> List[float]:
+        vector = await self.embeddings.aembed_query(query)
+        self._store(query, vector)
+        return vector
+
+    def _lookup(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(query)
+            if vector is not None:
+                self._memory.move_to_end(query)
+                self.memory_hits += 1
+                return vector
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT vector FROM query_embeddings WHERE model_id = ? AND query = ?",
+                    (self.model_id, query)
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(query, vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def _store(self, query: str, vector: List[float]):
+        with self._lock:
+            self._remember(query, vector)
+            if self._disk is None:
+                return
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model_id, query, vector) VALUES (?, ?, ?)",
+                    (self.model_id, query, array("f", vector).tobytes())
+                )
+                self._disk.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN ("
+                    "SELECT rowid FROM query_embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write query embedding cache: {e}")
+
+    def _remember(self, query: str, vector: List[float]):
+        self._memory[query] = vector
+        self._memory.move_to_end(query)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model_id": self.model_id,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.flights.coalesced,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -1,18 +1,94 @@
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_aws.chat_models import ChatBedrock
-from langchain_aws.embeddings import BedrockEmbeddings
 
 load_dotenv()
 
-def get_llm():
-    return ChatBedrock(
-        region_name=os.getenv("AWS_REGION"),
-        model_id="anthropic.claude-3-5-sonnet-20240620-v1:0",
-        model_kwargs={
-            "temperature": 0.3,
-        }
-    )
+LLM_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+# Tag for LLM calls whose output is shown to the student; /chat/stream only
+# forwards tokens from runs carrying it.
+USER_FACING_TAG = "user_facing"
+
+# "bedrock" talks to AWS; "stub" swaps in local models from stub_models.py so
+# per-call overhead can be measured without the network or the model.
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "bedrock").lower()
+STUB_LATENCY = float(os.getenv("STUB_LATENCY_MS", "0")) / 1000
+STUB_LATENCY_PER_TOKEN = float(os.getenv("STUB_LATENCY_PER_1K_TOKENS_MS", "0")) / 1000 / 1000
+STUB_JITTER = float(os.getenv("STUB_JITTER", "0"))  # fraction, e.g. 0.2 spreads delays by +/-20%
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH")  # e.g. ./cache/query_embeddings.sqlite
+# Concurrent identical prompts share one model call; "0" sends each one.
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no")
+
+_clients = {}
+# Factories resolve the clients they depend on before taking the lock; it is
+# re-entrant as well, so one that does not cannot deadlock.
+_clients_lock = threading.RLock()
+
+
+def _get_or_create(key: tuple, factory):
+    """Return the registered client for key, creating it once if needed."""
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def _bedrock_runtime(region_name: str):
+    """Shared boto3 bedrock-runtime client; boto3 clients are thread-safe and
+    keep a pool of HTTP connections, so every model client reuses this one."""
+    def factory():
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "bedrock-runtime",
+            region_name=region_name,
+            config=Config(
+                max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=True,
+                retries={"max_attempts": 3, "mode": "adaptive"},
+            ),
+        )
+
+    return _get_or_create(("bedrock-runtime", region_name), factory)
+
+
+def get_llm(model_id: str = LLM_MODEL_ID, temperature: float = 0.3):
+    """Return the long-lived chat model for this configuration."""
+    region_name = os.getenv("AWS_REGION")
+    runtime = _bedrock_runtime(region_name) if MODEL_BACKEND != "stub" else None
+
+    def model():
+        if MODEL_BACKEND == "stub":
+            from src.models.stub_models import StubChatModel
+            return StubChatModel(latency=STUB_LATENCY, latency_per_token=STUB_LATENCY_PER_TOKEN, jitter=STUB_JITTER)
+
+        from langchain_aws.chat_models import ChatBedrock
+        return ChatBedrock(
+            client=runtime,
+            region_name=region_name,
+            model_id=model_id,
+            model_kwargs={
+                "temperature": temperature,
+            }
+        )
+
+    def factory():
+        if not LLM_SINGLE_FLIGHT:
+            return model()
+        from src.models.single_flight_chat import SingleFlightChatModel
+        from src.utils.single_flight import SingleFlight
+        return SingleFlightChatModel(model=model(), flights=SingleFlight("llm"))
+
+    return _get_or_create(("llm", MODEL_BACKEND, region_name, model_id, temperature), factory)
 
 # def get_embeddings():
 #     from langchain_google_genai import GoogleGenerativeAIEmbeddings
@@ -22,8 +98,43 @@ def get_llm():
 #     )
 
 
-def get_embeddings():
-    return BedrockEmbeddings(
-        region_name=os.getenv("AWS_REGION"),
-        model_id="amazon.titan-embed-text-v1"
-    )
\ No newline at end of file
+def get_embeddings(model_id: str = EMBEDDING_MODEL_ID):
+    """Return the long-lived embeddings client for this configuration."""
+    region_name = os.getenv("AWS_REGION")
+    runtime = _bedrock_runtime(region_name) if MODEL_BACKEND != "stub" else None
+
+    def factory():
+        if MODEL_BACKEND == "stub":
+            from src.models.stub_models import StubEmbeddings
+            return StubEmbeddings(latency=STUB_LATENCY, jitter=STUB_JITTER)
+
+        from langchain_aws.embeddings import BedrockEmbeddings
+        return BedrockEmbeddings(
+            client=runtime,
+            region_name=region_name,
+            model_id=model_id
+        )
+
+    return _get_or_create(("embeddings", MODEL_BACKEND, region_name, model_id), factory)
+
+
+def get_query_embeddings(model_id: str = EMBEDDING_MODEL_ID):
+    """Embeddings client whose query embeddings go through the LRU/disk cache."""
+    embeddings = get_embeddings(model_id)
+
+    def factory():
+        from src.models.embedding_cache import CachedQueryEmbeddings
+        return CachedQueryEmbeddings(
+            embeddings,
+            model_id=f"{MODEL_BACKEND}:{model_id}",
+            max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+            disk_path=QUERY_EMBEDDING_CACHE_PATH
+        )
+
+    return _get_or_create(("query-embeddings", MODEL_BACKEND, os.getenv("AWS_REGION"), model_id), factory)
+
+
+def reset_clients():
+    """Drop every registered client so the next call builds fresh ones."""
+    with _clients_lock:
+        _clients.clear()
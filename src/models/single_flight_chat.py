@@ -0,0 +1,99 @@
+import hashlib
+import json
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+from src.utils.single_flight import SingleFlight
+
+
+def prompt_key(messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+    """Digest of what the model sees. Message ids differ between sessions
+    and are left out, so the same prompt from two students matches."""
+    payload = [
+        [message.type, message.content, message.name,
+         getattr(message, "tool_calls", None), getattr(message, "tool_call_id", None)]
+        for message in messages
+    ]
+    return hashlib.sha256(json.dumps([payload, stop, kwargs], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlightChatModel(BaseChatModel):
+    """Chat model wrapper that sends concurrent identical prompts to the
+    wrapped model once.
+
+    Callers that joined another caller's call get the same reply without
+    usage metadata, so token counts stay those actually billed. Streamed
+    calls pass straight through: each stream needs its own token callbacks.
+    """
+
+    model: BaseChatModel
+    flights: SingleFlight
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        # The wrapped model formats the tools; its binding's arguments reach _generate.
+        return self.bind(**self.model.bind_tools(tools, **kwargs).kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, shared = self.flights.do(
+            prompt_key(messages, stop, kwargs), lambda: self.model._generate(messages, stop=stop, **kwargs)
+        )
+        return _without_usage(result) if shared else result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, shared = await self.flights.ado(
+            prompt_key(messages, stop, kwargs), lambda: self.model._agenerate(messages, stop=stop, **kwargs)
+        )
+        return _without_usage(result) if shared else result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        return self.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        return self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def _without_usage(result: ChatResult) -> ChatResult:
+    """A copy of result for a caller whose call was coalesced: no tokens were spent on it."""
+    generations = [
+        ChatGeneration(message=generation.message.model_copy(update={"usage_metadata": None, "id": None}),
+                       generation_info=generation.generation_info)
+        for generation in result.generations
+    ]
+    return ChatResult(generations=generations, llm_output=None)
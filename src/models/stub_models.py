@@ -0,0 +1,131 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.utils.message_filters import estimate_tokens
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _unit(text: str) -> float:
+    """Deterministic value in [0, 1) derived from text."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+def _delay(base: float, jitter: float, key: str) -> float:
+    """base spread by up to +/- jitter (a fraction), the same for the same key."""
+    return max(0.0, base * (1 + jitter * (2 * _unit(key) - 1))) if jitter else base
+
+
+class StubChatModel(BaseChatModel):
+    """Local chat model that answers with a canned reply after a simulated delay.
+
+    Used instead of Bedrock to measure how much of a turn is spent outside
+    the model itself. The delay is latency plus latency_per_token for every
+    prompt token, spread by jitter; the reply is picked from replies by a
+    hash of the prompt. Both depend only on the prompt, so replaying the
+    same conversation gives the same answers and timings.
+    """
+
+    response: str = "That sounds fun! What else do you enjoy doing?"
+    replies: List[str] = []
+    latency: float = 0.0
+    latency_per_token: float = 0.0
+    jitter: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        # Never calls tools; returns a binding like real chat models do.
+        return self.bind()
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], reply: str) -> dict:
+        """Estimated token usage, reported like Bedrock's usage_metadata."""
+        prompt = sum(estimate_tokens(str(message.content)) for message in messages)
+        completion = estimate_tokens(reply)
+        return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        delay = self.latency + self.latency_per_token * estimate_tokens(prompt)
+        if delay:
+            time.sleep(_delay(delay, self.jitter, prompt))
+        if self.replies:
+            return self.replies[int(_unit(prompt) * len(self.replies))]
+        return self.response
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        reply = self._reply(messages)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages)
+        tokens = re.findall(r"\S+\s*", reply)
+        for i, token in enumerate(tokens):
+            # Usage arrives with the final chunk, as in Bedrock's stream.
+            usage = self._usage(messages, reply) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings with an optional delay,
+    spread by jitter like StubChatModel's."""
+
+    def __init__(self, size: int = 1536, latency: float = 0.0, jitter: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in _TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value & (1 << 63) else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _record_call(self, key: str):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(_delay(self.latency, self.jitter, key))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._record_call("\n".join(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._record_call(text)
+        return self._embed(text)
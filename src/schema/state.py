@@ -1,13 +1,35 @@
-from typing import TypedDict, List, Optional, Annotated
+import uuid
+from typing import TypedDict, List, Optional, Annotated, Union
 from typing_extensions import Literal
-from langgraph.graph import add_messages
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, convert_to_messages
+
+def reduce_interests(left: List[str], right: List[str]) -> List[str]:
+    """Reducer for interests to avoid duplicates."""
+    combined = left + right
+    return list(dict.fromkeys(combined))
+
+def append_messages(left: List[BaseMessage], right: Union[List[BaseMessage], BaseMessage]) -> List[BaseMessage]:
+    """Reducer for messages: nodes return only the new messages, which are
+    appended. Unlike add_messages, the existing history is never re-scanned
+    for ids, so only the delta is converted and assigned ids."""
+    if not isinstance(right, list):
+        right = [right]
+    new_messages = convert_to_messages(right)
+    for message in new_messages:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+    # A new list rather than left.extend(): checkpoints and state snapshots
+    # share the previous list object.
+    return left + new_messages
 
 class CourseRecommenderState(TypedDict):
     """State schema for the course recommender agent."""
-    messages: Annotated[List[BaseMessage], add_messages]
+    messages: Annotated[List[BaseMessage], append_messages]
     grade: Optional[int]
-    interests: List[str]
+    interests: Annotated[List[str], reduce_interests]
+    interest_watermark: int  # messages[:interest_watermark] already scanned for interests
+    summary: str  # rolling summary of messages[:summary_watermark]
+    summary_watermark: int
     credit_preference: Optional[str]
 
     conversation_stage: Literal["greeting", "discovery", "recommendation", "complete"]
@@ -19,8 +41,3 @@ class CourseRecommenderState(TypedDict):
 
     retrieved_courses: List[dict]
     last_recommendation: Optional[str]
-
-def reduce_interests(left: List[str], right: List[str]) -> List[str]:
-    """Reducer for interests to avoid duplicates."""
-    combined = left + right
-    return list(dict.fromkeys(combined))
@@ -1,40 +1,31 @@
 from typing import List
 from langchain.tools import tool
 from langchain_core.messages import BaseMessage
-from src.models.llm_config import get_llm
+from src.models.llm_config import get_llm, USER_FACING_TAG
 from src.utils.message_filters import format_conversation_history
 from src.agentic_prompts.interest_conversation_prompt import interest_conversation_prompt
 from src.agentic_prompts.course_recommendation_prompt import recommendation_prompt
 
-@tool
-def generate_discovery_response(messages: List[BaseMessage], grade: int, interests: List[str]) -> str:
-    """Generate a conversational discovery response using the interest_conversation_prompt."""
-    llm = get_llm()
-    chat_history = format_conversation_history(messages)
+def _discovery_prompt(messages: List[BaseMessage], grade: int, summary: str = "") -> str:
+    chat_history = format_conversation_history(messages, summary)
     last_user = messages[-1].content if messages and isinstance(messages[-1], BaseMessage) else ""
 
-    prompt = interest_conversation_prompt.format(
+    return interest_conversation_prompt.format(
         grade=grade,
         chat_history=chat_history,
         user_input=last_user
     )
 
-    result = llm.invoke(prompt)
-    return result.content.strip()
-
-@tool
-def generate_course_recommendation(
+def _recommendation_prompt(
     query: str,
     grade: int,
     interests: List[str],
     credit_preference: str,
     course_context: str
 ) -> str:
-    """Generate course recommendations using the recommendation_prompt."""
-    llm = get_llm()
     interests_text = ", ".join(interests) if interests else "general academic interests"
 
-    formatted = recommendation_prompt.format(
+    return recommendation_prompt.format(
         context=course_context,
         grade=grade,
         interests=interests_text,
@@ -42,5 +33,48 @@ def generate_course_recommendation(
         question=query
     )
 
-    result = llm.invoke(formatted)
+@tool
+def generate_discovery_response(messages: List[BaseMessage], grade: int, interests: List[str], summary: str = "") -> str:
+    """Generate a conversational discovery response using the interest_conversation_prompt."""
+    llm = get_llm()
+    prompt = _discovery_prompt(messages, grade, summary)
+
+    result = llm.invoke(prompt, config={"tags": [USER_FACING_TAG]})
+    return result.content.strip()
+
+async def agenerate_discovery_response(messages: List[BaseMessage], grade: int, interests: List[str], summary: str = "") -> str:
+    """Async version of generate_discovery_response."""
+    llm = get_llm()
+    prompt = _discovery_prompt(messages, grade, summary)
+
+    result = await llm.ainvoke(prompt, config={"tags": [USER_FACING_TAG]})
+    return result.content.strip()
+
+@tool
+def generate_course_recommendation(
+    query: str,
+    grade: int,
+    interests: List[str],
+    credit_preference: str,
+    course_context: str
+) -> str:
+    """Generate course recommendations using the recommendation_prompt."""
+    llm = get_llm()
+    formatted = _recommendation_prompt(query, grade, interests, credit_preference, course_context)
+
+    result = llm.invoke(formatted, config={"tags": [USER_FACING_TAG]})
+    return result.content.strip()
+
+async def agenerate_course_recommendation(
+    query: str,
+    grade: int,
+    interests: List[str],
+    credit_preference: str,
+    course_context: str
+) -> str:
+    """Async version of generate_course_recommendation."""
+    llm = get_llm()
+    formatted = _recommendation_prompt(query, grade, interests, credit_preference, course_context)
+
+    result = await llm.ainvoke(formatted, config={"tags": [USER_FACING_TAG]})
     return result.content.strip()
@@ -0,0 +1,28 @@
+from typing import List
+from langchain_core.messages import BaseMessage
+from langchain.tools import tool
+from src.models.llm_config import get_llm
+from src.agentic_prompts.conversation_summary_prompt import conversation_summary_prompt
+
+def _summary_prompt(summary: str, messages: List[BaseMessage]) -> str:
+    chat_history = "\n".join(
+        f"{'Student' if msg.type == 'human' else 'Bot'}: {msg.content}" for msg in messages
+    )
+    return conversation_summary_prompt.format(summary=summary or "(none)", chat_history=chat_history)
+
+def _parse_summary(summary_text: str) -> str:
+    summary_text = summary_text.strip()
+    return "" if summary_text == "Nothing notable yet." else summary_text
+
+@tool
+def summarize_conversation(summary: str, messages: List[BaseMessage]) -> str:
+    """Fold older conversation messages into the rolling conversation summary."""
+    llm = get_llm()
+    response = llm.invoke(_summary_prompt(summary, messages))
+    return _parse_summary(response.content)
+
+async def asummarize_conversation(summary: str, messages: List[BaseMessage]) -> str:
+    """Async version of summarize_conversation."""
+    llm = get_llm()
+    response = await llm.ainvoke(_summary_prompt(summary, messages))
+    return _parse_summary(response.content)
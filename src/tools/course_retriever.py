@@ -1,62 +1,396 @@
+import logging
+import math
 import os
-import pickle
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
+import threading
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+import faiss
+import numpy as np
 from langchain.docstore.document import Document
 from langchain.tools import tool
-from src.models.llm_config import get_embeddings
+from src.models.llm_config import get_query_embeddings
+from src.tools.index_builder import DOCS_DIR, INDEX_FILE, index_config, load_manifest, read_index
+from src.tools.index_factory import configure, search_parameters
+from src.tools.lexical_index import BM25Index, tokenize
+from src.utils.document_store import DocumentStore
+from src.utils.metrics import metrics
+from src.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Fuse FAISS with an in-process BM25 index; "0" searches FAISS only.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1").lower() not in ("0", "false", "no")
+RRF_K = 60
+CANDIDATE_MULTIPLIER = 5  # each ranking contributes k * this candidates to the fusion
+# "course" collapses chunk hits to the best chunk of each course, so k results
+# are k distinct courses; "chunk" returns the best chunks as they come.
+RESULT_UNIT = os.getenv("RESULT_UNIT", "course").lower()
+COURSE_RESULTS = RESULT_UNIT != "chunk"
+# Seconds between checks for a newly built index, so every worker picks it up
+# without a /refresh_index of its own; "0" reloads only on /refresh_index.
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "10"))
+
+def build_lexical_index(documents: DocumentStore) -> Tuple[BM25Index, List[set]]:
+    """BM25 over title, subjects and chunk text, and each chunk's title and
+    subject terms."""
+    started = time.perf_counter()
+    texts, field_terms = [], []
+    for position in range(len(documents)):
+        doc = documents.get(position)
+        fields = " ".join([str(doc.metadata.get("title", ""))] + [str(s) for s in doc.metadata.get("subjects", [])])
+        field_terms.append(set(tokenize(fields)))
+        texts.append(tokenize(fields) + tokenize(doc.page_content))
+    lexical = BM25Index(texts)
+    logger.info(f"Built lexical index over {len(texts)} chunks in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return lexical, field_terms
+
+
+class _Store:
+    """One loaded build: the FAISS index, its documents and the lookups
+    derived from them. reload() swaps in a new one, fully built, instead of
+    changing it, so a search that took the current store reads one
+    consistent build without locking; the selector cache is only added to."""
+
+    def __init__(
+        self,
+        index: faiss.Index,
+        documents: DocumentStore,
+        config: Tuple[str, Dict[str, Any]],
+        version: str,
+        lexical: Optional[BM25Index] = None,
+        field_terms: Optional[List[set]] = None
+    ):
+        self.index = index
+        self.documents = documents
+        self.config = config
+        self.version = version
+        self.lexical = lexical
+        self.field_terms = field_terms or []
+        self.selectors: Dict[Tuple, Tuple[Optional[faiss.IDSelector], int, int, Optional[np.ndarray]]] = {}
+        # Chunk hits fetched per wanted course on the first try.
+        self.chunks_per_course = math.ceil(len(documents) / max(documents.course_count, 1))
+
+    def eligible_mask(self, grade: Optional[int], credit_preference: Optional[str]) -> Optional[np.ndarray]:
+        """Positions matching the filters as a boolean mask, or None when nothing is filtered out."""
+        credit = (credit_preference or "any").lower()
+        if grade is None and credit == "any":
+            return None
+
+        documents = self.documents
+        eligible = np.ones(len(documents), dtype=bool)
+        if grade is not None:
+            grade = int(grade)
+            eligible &= (documents.grades & (1 << grade)).astype(bool) if 0 <= grade <= 31 else False
+        if "dual" in credit:
+            eligible &= documents.dual_credit
+        elif "recovery" in credit:
+            eligible &= documents.credit_recovery
+        elif "regular" in credit:
+            eligible &= ~(documents.dual_credit | documents.credit_recovery)
+        return eligible
+
+    def selector(
+        self,
+        grade: Optional[int],
+        credit_preference: Optional[str]
+    ) -> Tuple[Optional[faiss.IDSelector], int, int, Optional[np.ndarray]]:
+        """Cached (selector, eligible chunks, eligible results, mask); a None
+        selector means no filtering. Results are courses or chunks, per RESULT_UNIT."""
+        key = (grade, (credit_preference or "any").lower())
+        cached = self.selectors.get(key)
+        if cached is None:
+            mask = self.eligible_mask(grade, credit_preference)
+            documents = self.documents
+            if mask is None:
+                results = documents.course_count if COURSE_RESULTS else len(documents)
+                cached = (None, len(documents), results, None)
+            else:
+                ids = np.flatnonzero(mask).astype("int64")
+                results = len(np.unique(documents.courses[ids])) if COURSE_RESULTS else len(ids)
+                cached = (faiss.IDSelectorBatch(ids), len(ids), results, mask)
+            # Two searches racing here build equal entries; either may win.
+            self.selectors[key] = cached
+        return cached
+
+    def result_key(self, position: int) -> int:
+        """What makes two hits the same result: their course, or the chunk itself."""
+        return int(self.documents.courses[position]) if COURSE_RESULTS else position
+
 
 class CourseRetriever:
+    """Searches the prebuilt course index; build it with `python build_index.py`."""
 
-    def __init__(self, docs: List[Document], persist_path: str = "./faiss_store"):
+    def __init__(self, persist_path: str = "./faiss_store"):
         self.persist_path = persist_path
-        self.vectorstore = self._build_vector_store(docs)
+        self.embeddings = get_query_embeddings()
+        # Serializes reload(); searches read self._store without locking.
+        self._reload_lock = threading.Lock()
+        self._reload_listeners: List[Callable[[], None]] = []
+        self._next_reload_check = time.monotonic() + INDEX_RELOAD_INTERVAL
+        self._stats_lock = threading.Lock()
+        self.lexical_only_searches = 0
+        self.hybrid_searches = 0
+        self.refetches = 0
+        # Identical searches in flight at once (a class starting together) run once.
+        self.flights = SingleFlight("retrieval")
+        self._store = self._load_store(self.index_version)
+
+    def _load_store(self, version: str) -> _Store:
+        """Memory-map the index and the document store of the current build,
+        with the index type and parameters it was built with, and build the
+        lexical index over it. This is the slow part of a reload (seconds
+        for a large catalog), so it never runs inside a search."""
+        if not os.path.exists(os.path.join(self.persist_path, INDEX_FILE)):
+            raise RuntimeError(
+                f"No course index at {self.persist_path}; build it first with `python build_index.py`"
+            )
+
+        started = time.perf_counter()
+        # Resolve the symlink once so the index and documents come from the same build.
+        build_path = os.path.realpath(self.persist_path)
+        manifest = load_manifest(build_path) or {}
+        if manifest.get("embedding_model") != self.embeddings.model_id:
+            logger.warning(f"Index was built with {manifest.get('embedding_model')}, "
+                           f"but queries use {self.embeddings.model_id}; rebuild it with build_index.py")
+
+        index_type, params = index_config(manifest)
+        index = read_index(build_path, index_type)
+        configure(index, index_type, params)
+        documents = DocumentStore(os.path.join(build_path, DOCS_DIR))
+        logger.info(f"Mapped {index_type} FAISS index with {index.ntotal} chunks in {(time.perf_counter() - started) * 1000:.1f} ms")
+        lexical, field_terms = build_lexical_index(documents) if HYBRID_SEARCH else (None, None)
+        return _Store(index, documents, (index_type, params), version, lexical, field_terms)
+
+    def reload(self) -> Dict[str, Any]:
+        """Load the index again if a new build has been swapped in."""
+        with self._reload_lock:
+            version = self.index_version
+            if version == self._store.version:
+                return {"reloaded": False, "index_version": version}
+
+            # Searches already running finish on the store they took.
+            self._store = self._load_store(version)
+            for listener in self._reload_listeners:
+                listener()
+        logger.info(f"Reloaded FAISS index {version}")
+        return {"reloaded": True, "index_version": version}
 
-    def _build_vector_store(self, docs: List[Document]) -> FAISS:
-        os.makedirs(self.persist_path, exist_ok=True)
+    def on_reload(self, listener: Callable[[], None]):
+        """Call listener after every reload, e.g. to drop results cached from the old index."""
+        self._reload_listeners.append(listener)
 
-        embeddings = get_embeddings()
-        faiss_index_path = os.path.join(self.persist_path, "index")
-        doc_store_path = os.path.join(self.persist_path, "doc_store.pkl")
+    def reload_if_stale(self):
+        """Reload in the background when the index on disk changed, checking
+        at most every INDEX_RELOAD_INTERVAL seconds. Searches keep using the
+        current store until the new one is built."""
+        if not INDEX_RELOAD_INTERVAL or time.monotonic() < self._next_reload_check:
+            return
+        self._next_reload_check = time.monotonic() + INDEX_RELOAD_INTERVAL
+        if self.index_version != self.loaded_version and not self._reload_lock.locked():
+            threading.Thread(target=self._reload_quietly, name="index-reload", daemon=True).start()
 
-        if os.path.exists(faiss_index_path) and os.path.exists(doc_store_path):
-            try:
-                print("[INFO] Loading existing FAISS index...")
-                return FAISS.load_local(
-                    faiss_index_path,
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-            except Exception as e:
-                print(f"[WARN] Failed to load FAISS index: {e}")
+    def _reload_quietly(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f"Failed to reload the course index, still serving {self.loaded_version}: {e}")
 
-        print("[INFO] Creating new FAISS index...")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=100
-        )
-        split_docs = splitter.split_documents(docs)
+    @property
+    def loaded_version(self) -> str:
+        """Version of the index being served, which lags index_version until a reload."""
+        return self._store.version
 
-        if split_docs:
-            print("[DEBUG] Sample document chunk:", split_docs[0])
+    @property
+    def index_version(self) -> str:
+        """Changes whenever the FAISS index on disk is rebuilt."""
+        try:
+            stat = os.stat(os.path.join(self.persist_path, INDEX_FILE))
+        except OSError:
+            return "unsaved"
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
 
-        vectorstore = FAISS.from_documents(split_docs, embeddings)
-        vectorstore.save_local(faiss_index_path)
+    def _gather(self, store: _Store, search: Callable[[int], List[int]], n: int, chunks: int, results: int) -> List[int]:
+        """The top n results of search(fetch), which ranks up to fetch chunk
+        positions. For course results each course keeps its best chunk, and
+        the fetch doubles until n distinct courses turn up or the eligible
+        chunks run out."""
+        n = min(n, results)
+        if not COURSE_RESULTS:
+            return search(min(n, chunks))
+        fetch = min(chunks, n * store.chunks_per_course)
+        while True:
+            positions = search(fetch)
+            seen, kept = set(), []
+            for position in positions:
+                course = store.result_key(position)
+                if course not in seen:
+                    seen.add(course)
+                    kept.append(position)
+                    if len(kept) == n:
+                        return kept
+            if len(positions) < fetch or fetch >= chunks:
+                return kept
+            fetch = min(chunks, fetch * 2)
+            with self._stats_lock:
+                self.refetches += 1
 
-        with open(doc_store_path, "wb") as f:
-            pickle.dump(split_docs, f)
+    def _lexical_search(self, store: _Store, query: str, k: int, grade, credit_preference) -> Tuple[List[int], bool]:
+        """BM25 positions, and whether they are strong enough to skip the
+        embedding. The comma-separated parts of the query are matched one by
+        one (the agent lists one interest per part): every top hit must have
+        all the terms of some part in its title or subjects, and the top hits
+        must between them cover as many different parts as there are hits,
+        or every part."""
+        terms = tokenize(query)
+        if not HYBRID_SEARCH or not terms:
+            return [], False
+        parts = [part for part in (frozenset(tokenize(text)) for text in query.split(",")) if part]
+        lexical = store.lexical
+        _, chunks, results, mask = store.selector(grade, credit_preference)
+        positions = self._gather(store, lambda fetch: lexical.search(terms, fetch, mask),
+                                 k * CANDIDATE_MULTIPLIER, chunks, results)
+        top = positions[:min(k, results)]
+        covered = set()
+        for position in top:
+            matched = {part for part in parts if part <= store.field_terms[position]}
+            if not matched:
+                return positions, False
+            covered |= matched
+        strong = bool(top) and len(top) == min(k, results) and len(covered) >= min(len(parts), len(top))
+        return positions, strong
 
-        print("[INFO] FAISS index created and saved")
-        return vectorstore
+    def search_courses(
+        self,
+        query: str,
+        k: int = 3,
+        grade: Optional[int] = None,
+        credit_preference: Optional[str] = None
+    ) -> List[Document]:
+        """Search for relevant courses for recommendation.
 
-    def search_courses(self, query: str, k: int = 3) -> List[Document]:
-        """Search for relevant courses for recommendation."""
-        results = self.vectorstore.similarity_search(query, k=k)
+        grade and credit_preference are applied inside both searches, so up to
+        k eligible courses come back; with RESULT_UNIT=course they are k
+        distinct courses, each represented by its best-matching chunk. Dense
+        FAISS results are fused with BM25 results by reciprocal rank; when the
+        lexical match is strong the embedding call is skipped altogether.
+        Concurrent identical searches share one execution.
+        """
+        self.reload_if_stale()
+        key = self._search_key(query, k, grade, credit_preference)
+        results, _ = self.flights.do(key, lambda: self._search(query, k, grade, credit_preference))
+        return list(results)
 
+    async def asearch_courses(
+        self,
+        query: str,
+        k: int = 3,
+        grade: Optional[int] = None,
+        credit_preference: Optional[str] = None
+    ) -> List[Document]:
+        """Async version of search_courses; only the query embedding is awaited."""
+        self.reload_if_stale()
+        key = self._search_key(query, k, grade, credit_preference)
+        results, _ = await self.flights.ado(key, lambda: self._asearch(query, k, grade, credit_preference))
+        return list(results)
+
+    def _search_key(self, query: str, k: int, grade, credit_preference) -> tuple:
+        return (self.loaded_version, " ".join(query.lower().split()), k, grade, (credit_preference or "any").lower())
+
+    def _search(self, query: str, k: int, grade, credit_preference) -> List[Document]:
+        steps = self._search_steps(query, k, grade, credit_preference)
+        try:
+            steps.send(self.embeddings.embed_query(next(steps)))
+        except StopIteration as finished:
+            return finished.value
+
+    async def _asearch(self, query: str, k: int, grade, credit_preference) -> List[Document]:
+        steps = self._search_steps(query, k, grade, credit_preference)
+        try:
+            steps.send(await self.embeddings.aembed_query(next(steps)))
+        except StopIteration as finished:
+            return finished.value
+
+    def _search_steps(self, query: str, k: int, grade, credit_preference) -> Generator[str, List[float], List[Document]]:
+        """The search shared by _search and _asearch. When it needs the query
+        embedding it yields the query and expects the vector to be sent back,
+        so the caller embeds it directly or awaits it; it returns the results."""
+        started = time.perf_counter()
+        store = self._store
+        results, path = [], "empty"
+        if store.selector(grade, credit_preference)[2]:
+            lexical, strong = self._lexical_search(store, query, k, grade, credit_preference)
+            if strong:
+                results, path = self._documents(store, lexical[:k], lexical_only=True), "lexical"
+            else:
+                with metrics.timer("query_embedding_seconds"):
+                    vector = yield query
+                dense = self._vector_search(store, vector, k, grade, credit_preference)
+                results, path = self._fuse(store, dense, lexical, k), "hybrid"
+
+        metrics.observe("retrieval_seconds", time.perf_counter() - started, path=path)
+        self._log_results(query, results)
+        return results
+
+    @staticmethod
+    def _log_results(query: str, results: List[Document]):
         if not results:
-            print("[INFO] No relevant courses found for query:", query)
+            logger.info(f"No relevant courses found for query: {query}")
         else:
-            print(f"[INFO] Found {len(results)} course(s) for query:", query)
+            logger.debug(f"Found {len(results)} course(s) for query: {query}")
 
-        return results
+    def _vector_search(
+        self,
+        store: _Store,
+        embedding: List[float],
+        k: int,
+        grade: Optional[int] = None,
+        credit_preference: Optional[str] = None
+    ) -> List[int]:
+        vector = np.array([embedding], dtype="float32")
+        n = k * CANDIDATE_MULTIPLIER if HYBRID_SEARCH else k
+
+        selector, chunks, results, _ = store.selector(grade, credit_preference)
+        if not results:
+            return []
+        params = search_parameters(*store.config, selector)
+
+        def search(fetch: int) -> List[int]:
+            _, positions = store.index.search(vector, fetch, params=params)
+            return [int(position) for position in positions[0] if position != -1]
+
+        return self._gather(store, search, n, chunks, results)
+
+    def _fuse(self, store: _Store, dense: List[int], lexical: List[int], k: int) -> List[Document]:
+        """Reciprocal rank fusion of the dense and lexical rankings; a course
+        is represented by the first of its chunks either ranking returned."""
+        if not lexical:
+            return self._documents(store, dense[:k])
+        scores: Dict[int, float] = {}
+        best: Dict[int, int] = {}
+        for ranking in (dense, lexical):
+            for rank, position in enumerate(ranking):
+                key = store.result_key(position)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+                best.setdefault(key, position)
+        return self._documents(store, [best[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]])
+
+    def _documents(self, store: _Store, positions: List[int], lexical_only: bool = False) -> List[Document]:
+        with self._stats_lock:
+            if lexical_only:
+                self.lexical_only_searches += 1
+            else:
+                self.hybrid_searches += 1
+        return [store.documents.get(position) for position in positions]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            searches = self.lexical_only_searches + self.hybrid_searches
+            return {
+                "hybrid_search": HYBRID_SEARCH,
+                "result_unit": "course" if COURSE_RESULTS else "chunk",
+                "refetches": self.refetches,
+                "coalesced_searches": self.flights.coalesced,
+                "lexical_only": self.lexical_only_searches,
+                "with_embedding": self.hybrid_searches,
+                "lexical_only_rate": round(self.lexical_only_searches / searches, 3) if searches else 0.0,
+            }
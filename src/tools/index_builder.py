@@ -0,0 +1,387 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from src.tools.index_factory import build_index
+from src.utils.document_store import DocumentStore, DocumentStoreWriter
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+DOCS_DIR = "docs"
+MANIFEST_FILE = "manifest.json"
+# Raw vectors, kept next to approximate indexes, which cannot give them back
+# exactly; later builds reuse them for unchanged courses.
+VECTORS_FILE = "vectors.npy"
+# Map the vectors instead of reading them into the heap; read-only mappings
+# are shared by every process that opens the same build.
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+# IVF inverted lists are mapped through a different hook that rejects MMAP_IFC.
+IVF_MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+# What one vector stands for: a chunk of a course description, or a whole course.
+GRANULARITIES = ("chunk", "course")
+
+
+def course_key(doc: Document) -> str:
+    return str(doc.metadata.get("courseId", "N/A"))
+
+
+def course_hash(docs: List[Document]) -> str:
+    """Content hash of one course's documents, text and metadata included."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def group_courses(docs: Iterable[Document]) -> Iterator[Tuple[str, List[Document]]]:
+    """(courseId, documents) pairs; documents of one course must be adjacent."""
+    key, group = None, []
+    for doc in docs:
+        if group and course_key(doc) != key:
+            yield key, group
+            group = []
+        key = course_key(doc)
+        group.append(doc)
+    if group:
+        yield key, group
+
+
+def read_index(persist_path: str, index_type: str = "flat") -> faiss.Index:
+    flags = IVF_MMAP_FLAGS if index_type in ("ivf", "ivfpq") else MMAP_FLAGS
+    return faiss.read_index(os.path.join(persist_path, INDEX_FILE), flags)
+
+
+def index_config(manifest: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """(index type, parameters) recorded in a manifest; older builds are flat."""
+    config = (manifest or {}).get("index") or {}
+    return config.get("type", "flat"), config.get("params", {})
+
+
+def load_manifest(persist_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(persist_path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class IndexBuilder:
+    """Builds the course FAISS store offline.
+
+    The catalog is consumed as a stream: each course is split, its chunks are
+    appended to the new document store and queued for embedding, and nothing
+    but per-chunk offsets is kept. Chunks are embedded in batches on a
+    bounded thread pool (at most two batches per worker in flight), each
+    batch call rate limited and retried with exponential backoff, and the
+    vectors land in an on-disk file by position. Courses whose content hash
+    matches the existing manifest reuse their stored vectors. The new
+    store is written to a fresh directory and swapped in through a symlink,
+    so readers see either the old or the new store, never a partial one.
+    index_type and index_params pick the FAISS index (see index_factory);
+    both are recorded in the manifest. granularity="course" skips the
+    splitter and embeds one vector per course, which shrinks the index by
+    the average number of chunks per course.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        persist_path: str = "./faiss_store",
+        batch_size: int = 32,
+        max_workers: int = 4,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 5,
+        chunk_size: int = 500,
+        chunk_overlap: int = 100,
+        index_type: str = "flat",
+        index_params: Optional[Dict[str, Any]] = None,
+        granularity: str = "chunk"
+    ):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.persist_path = persist_path.rstrip("/")
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.granularity = granularity
+
+    def build(self, docs: Iterable[Document], full: bool = False) -> Dict[str, Any]:
+        """Build the store from docs and swap it in; returns build statistics."""
+        started = time.perf_counter()
+        previous = None if full else self._load_previous()
+        old_courses = previous[1]["courses"] if previous else {}
+        parent = os.path.dirname(self.persist_path) or "."
+        os.makedirs(parent, exist_ok=True)
+        build_dir = tempfile.mkdtemp(
+            prefix=f"{os.path.basename(self.persist_path)}.{time.strftime('%Y%m%d%H%M%S')}-",
+            dir=parent
+        )
+
+        try:
+            courses: Dict[str, Dict[str, Any]] = {}
+            stats = defaultdict(int)
+            vectors = _VectorFile(os.path.join(build_dir, "vectors.tmp"))
+            with DocumentStoreWriter(os.path.join(build_dir, DOCS_DIR)) as store, \
+                    _BatchEmbedder(self, vectors) as embedder:
+                for key, course_docs in group_courses(docs):
+                    if key in courses:
+                        logger.warning(f"Skipping duplicate courseId {key}")
+                        stats["skipped"] += 1
+                        continue
+                    digest = course_hash(course_docs)
+                    old = old_courses.get(key)
+                    course_chunks = self.splitter.split_documents(course_docs) if self.granularity == "chunk" else course_docs
+                    course_ids = [f"{key}:{i}" for i in range(len(course_chunks))]
+                    reused = self._reuse_vectors(previous, old, digest, course_ids)
+
+                    for chunk_id, chunk in zip(course_ids, course_chunks):
+                        position = len(store)
+                        store.add(chunk_id, chunk)
+                        if reused is not None:
+                            vectors.write([position], [reused[chunk_id]])
+                        else:
+                            embedder.add(position, chunk.page_content)
+
+                    courses[key] = {"hash": digest, "ids": course_ids}
+                    stats["unchanged" if reused is not None else "changed" if old else "added"] += 1
+                chunk_count = len(store)
+            stats["removed"] = len(set(old_courses) - set(courses))
+            if not chunk_count:
+                raise RuntimeError("The course catalog produced no documents to index")
+
+            matrix = vectors.matrix(chunk_count)
+            index_started = time.perf_counter()
+            index, params = build_index(matrix, self.index_type, self.index_params)
+            index_seconds = time.perf_counter() - index_started
+            if self.index_type != "flat":
+                vectors.save_npy(os.path.join(build_dir, VECTORS_FILE), chunk_count)
+            del matrix
+            vectors.remove()
+
+            manifest = {
+                "embedding_model": self.model_id,
+                "index": {"type": self.index_type, "params": params},
+                "granularity": self.granularity,
+                "courses": courses
+            }
+            self._write(build_dir, index, manifest)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+
+        stats.update({
+            "chunks": chunk_count,
+            "embedded_chunks": embedder.embedded,
+            "reused_chunks": chunk_count - embedder.embedded,
+            "embed_seconds": round(embedder.seconds, 3),
+            "chunks_per_second": round(embedder.embedded / embedder.seconds, 1) if embedder.embedded and embedder.seconds else 0.0,
+            "index_type": self.index_type,
+            "granularity": self.granularity,
+            "index_seconds": round(index_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3)
+        })
+        return dict(stats)
+
+    def _load_previous(self) -> Optional[Tuple[Any, Dict[str, Any], Dict[str, int]]]:
+        """Stored vectors by position, the manifest and a chunk-id -> position
+        map of the existing store, if reusable."""
+        manifest = load_manifest(self.persist_path)
+        if not manifest or manifest.get("embedding_model") != self.model_id:
+            return None
+        if manifest.get("granularity", "chunk") != self.granularity:
+            return None
+        try:
+            index_type, _ = index_config(manifest)
+            if index_type == "flat":
+                stored = read_index(self.persist_path).reconstruct
+            else:
+                stored = np.load(os.path.join(self.persist_path, VECTORS_FILE), mmap_mode="r").__getitem__
+            doc_ids = DocumentStore(os.path.join(self.persist_path, DOCS_DIR)).ids()
+        except Exception as e:
+            logger.warning(f"Cannot reuse the existing index, rebuilding everything: {e}")
+            return None
+        return stored, manifest, {doc_id: position for position, doc_id in enumerate(doc_ids)}
+
+    @staticmethod
+    def _reuse_vectors(previous, old: Optional[Dict[str, Any]], digest: str, course_ids: List[str]):
+        """Stored vectors of an unchanged course, or None if it must be embedded."""
+        if previous is None or old is None or old["hash"] != digest or old["ids"] != course_ids:
+            return None
+        stored, _, positions = previous
+        if any(chunk_id not in positions for chunk_id in course_ids):
+            return None
+        return {chunk_id: np.array(stored(positions[chunk_id])) for chunk_id in course_ids}
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning(f"Embedding batch failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+
+    def _write(self, build_dir: str, index: faiss.Index, manifest: Dict[str, Any]):
+        """Finish the build directory, then point persist_path at it."""
+        faiss.write_index(index, os.path.join(build_dir, INDEX_FILE))
+        with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        # mkdtemp creates the directory 0700; the web app may run as another user.
+        os.chmod(build_dir, 0o755)
+
+        previous_dir = os.path.realpath(self.persist_path) if os.path.islink(self.persist_path) else None
+        if os.path.isdir(self.persist_path) and not os.path.islink(self.persist_path):
+            # A store from before builds were symlinked; move it out of the way.
+            shutil.rmtree(self.persist_path)
+
+        link_tmp = f"{self.persist_path}.link-{os.getpid()}"
+        os.symlink(os.path.basename(build_dir), link_tmp)
+        os.replace(link_tmp, self.persist_path)
+        if previous_dir and previous_dir != os.path.realpath(build_dir):
+            shutil.rmtree(previous_dir, ignore_errors=True)
+        logger.info(f"Index written to {build_dir} and linked from {self.persist_path}")
+
+
+class _VectorFile:
+    """float32 rows written by position in any order, so embedding batches
+    can land as they finish; read back as a memory map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dim: Optional[int] = None
+        self._file = open(path, "w+b")
+        self._lock = threading.Lock()
+
+    def write(self, positions: List[int], rows: Iterable[Any]):
+        with self._lock:
+            for position, row in zip(positions, rows):
+                row = np.asarray(row, dtype="float32")
+                if self.dim is None:
+                    self.dim = len(row)
+                elif len(row) != self.dim:
+                    raise ValueError(f"Embedding has {len(row)} dimensions, expected {self.dim}")
+                self._file.seek(position * self.dim * 4)
+                self._file.write(row.tobytes())
+
+    def matrix(self, count: int) -> np.ndarray:
+        self._file.flush()
+        return np.memmap(self.path, dtype="float32", mode="r", shape=(count, self.dim))
+
+    def save_npy(self, path: str, count: int, block: int = 65536):
+        """Copy the rows into an .npy file without loading them all."""
+        source = self.matrix(count)
+        target = np.lib.format.open_memmap(path, mode="w+", dtype="float32", shape=(count, self.dim))
+        for start in range(0, count, block):
+            target[start:start + block] = source[start:start + block]
+        target.flush()
+        del target
+
+    def remove(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class _BatchEmbedder:
+    """Collects chunks into batches and embeds them on the builder's thread
+    pool, writing each batch's vectors when it finishes. add() blocks while
+    too many batches are in flight, which keeps memory bounded."""
+
+    def __init__(self, builder: "IndexBuilder", vectors: _VectorFile):
+        self.builder = builder
+        self.vectors = vectors
+        self.embedded = 0
+        self.seconds = 0.0
+        self._positions: List[int] = []
+        self._texts: List[str] = []
+        self._slots = threading.BoundedSemaphore(builder.max_workers * 2)
+        self._futures = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._started: Optional[float] = None
+        self._done = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "_BatchEmbedder":
+        self._pool = ThreadPoolExecutor(max_workers=self.builder.max_workers, thread_name_prefix="embed")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._submit()
+                for future in self._futures:
+                    future.result()  # re-raises a batch that failed every retry
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=exc_type is not None)
+            if self._started is not None:
+                self.seconds = time.perf_counter() - self._started
+
+    def add(self, position: int, text: str):
+        self._positions.append(position)
+        self._texts.append(text)
+        if len(self._positions) >= self.builder.batch_size:
+            self._submit()
+
+    def _submit(self):
+        if not self._positions:
+            return
+        positions, texts = self._positions, self._texts
+        self._positions, self._texts = [], []
+        if self._started is None:
+            self._started = time.perf_counter()
+        self._slots.acquire()
+        future = self._pool.submit(self._run, positions, texts)
+        future.add_done_callback(lambda _: self._slots.release())
+        # Completed batches are dropped so their results can be freed.
+        self._futures = [f for f in self._futures if not f.done() or f.exception() is not None] + [future]
+        self.embedded += len(positions)
+
+    def _run(self, positions: List[int], texts: List[str]):
+        self.vectors.write(positions, self.builder._embed_batch(texts))
+        with self._lock:
+            self._done += len(positions)
+            done = self._done
+        elapsed = time.perf_counter() - self._started
+        logger.info(f"Embedded {done} chunks ({done / elapsed:.1f} chunks/s)")
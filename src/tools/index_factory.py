@@ -0,0 +1,100 @@
+import math
+from typing import Any, Dict, Optional, Tuple
+import faiss
+import numpy as np
+
+# Index types build_index.py can write. "flat" is exact; the others trade a
+# little recall for search time ("hnsw", "ivf") and memory ("ivfpq").
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+
+DEFAULT_PARAMS: Dict[str, Dict[str, Any]] = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    # nlist defaults to about 4 * sqrt(vectors), see resolve_params().
+    "ivf": {"nlist": None, "nprobe": 16},
+    "ivfpq": {"nlist": None, "nprobe": 16, "m": 64, "nbits": 8},
+}
+
+# Coarse quantizer and PQ training want this many points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+
+
+def parse_param(value: str) -> Tuple[str, Any]:
+    """A command-line key=value parameter, with the value read as a number."""
+    key, sep, raw = value.partition("=")
+    try:
+        if not sep:
+            raise ValueError
+        return key.strip(), float(raw) if "." in raw else int(raw)
+    except ValueError:
+        raise ValueError(f"expected key=<number>, got {value!r}") from None
+
+
+def resolve_params(index_type: str, params: Optional[Dict[str, Any]], vectors: int, dim: int) -> Dict[str, Any]:
+    """Defaults merged with params and fitted to the data, as saved in the manifest."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    unknown = set(params or {}) - set(DEFAULT_PARAMS[index_type])
+    if unknown:
+        raise ValueError(f"Unknown {index_type} parameter(s): {', '.join(sorted(unknown))}")
+    resolved = {**DEFAULT_PARAMS[index_type], **(params or {})}
+
+    if index_type in ("ivf", "ivfpq"):
+        nlist = resolved["nlist"] or int(4 * math.sqrt(vectors))
+        resolved["nlist"] = max(1, min(int(nlist), vectors // MIN_POINTS_PER_CENTROID or 1))
+        resolved["nprobe"] = max(1, min(int(resolved["nprobe"]), resolved["nlist"]))
+    if index_type == "ivfpq":
+        # Sub-quantizers must divide the dimension; each codebook's 2**nbits
+        # centroids want MIN_POINTS_PER_CENTROID training points each, like nlist.
+        resolved["m"] = max(m for m in range(1, min(int(resolved["m"]), dim) + 1) if dim % m == 0)
+        nbits = int(math.log2(max(vectors // MIN_POINTS_PER_CENTROID, 2)))
+        resolved["nbits"] = max(1, min(int(resolved["nbits"]), nbits))
+    return resolved
+
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", params: Optional[Dict[str, Any]] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """Create, train and fill an index of index_type; returns it with the
+    parameters actually used."""
+    count, dim = vectors.shape
+    params = resolve_params(index_type, params, count, dim)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(params["M"]))
+        index.hnsw.efConstruction = int(params["ef_construction"])
+    elif index_type == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, params["nlist"])
+    else:
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, params["nlist"], params["m"], params["nbits"])
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    configure(index, index_type, params)
+    return index, params
+
+
+def configure(index: faiss.Index, index_type: str, params: Dict[str, Any]):
+    """Apply the search-time parameters, which are not stored in the index file."""
+    if index_type == "hnsw":
+        index.hnsw.efSearch = int(params["ef_search"])
+    elif index_type in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).nprobe = int(params["nprobe"])
+
+
+def search_parameters(index_type: str, params: Dict[str, Any], selector: Optional[faiss.IDSelector]) -> Optional[faiss.SearchParameters]:
+    """Per-search parameters carrying selector; passing any parameters
+    replaces the index's own search settings, so those are repeated here."""
+    if selector is None:
+        return None
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=int(params["ef_search"]))
+    if index_type in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=int(params["nprobe"]))
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size of the index, about what it occupies in memory."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -5,41 +5,53 @@ from src.models.llm_config import get_llm
 from src.utils.message_filters import format_conversation_history
 from src.agentic_prompts.interest_extraction_prompt import extract_interest_prompt
 
+def _parse_interests(interests_text: str) -> List[str]:
+    """Turn the comma-separated LLM answer into a clean list of interests."""
+    interests_text = interests_text.strip().lower()
+
+    if "no clear interests yet" in interests_text or not interests_text:
+        return []
+
+    interests = [i.strip() for i in interests_text.split(",")]
+
+    filtered_interests = []
+    for interest in interests:
+        if len(interest) <= 2:
+            continue
+        if any(phrase in interest for phrase in [
+            "based on the conversation",
+            "there are no clear interests",
+            "which does not reveal",
+            "therefore",
+            "no clear interests yet",
+            "student has only said",
+            "not enough information",
+            "appropriate response"
+        ]):
+            continue
+        filtered_interests.append(interest)
+
+    return filtered_interests
+
 @tool
 def extract_interests(messages: List[BaseMessage]) -> List[str]:
-    """Extract student interests from conversation history using structured prompt."""
-    try:
-        llm = get_llm()
-        chat_history = format_conversation_history(messages)
-        prompt = extract_interest_prompt.format(chat_history=chat_history)
-
-        response = llm.invoke(prompt)
-        interests_text = response.content.strip().lower()
-
-        if "no clear interests yet" in interests_text or not interests_text:
-            return []
-
-        interests = [i.strip() for i in interests_text.split(",")]
-
-        filtered_interests = []
-        for interest in interests:
-            if len(interest) <= 2:
-                continue
-            if any(phrase in interest for phrase in [
-                "based on the conversation",
-                "there are no clear interests",
-                "which does not reveal",
-                "therefore",
-                "no clear interests yet",
-                "student has only said",
-                "not enough information",
-                "appropriate response"
-            ]):
-                continue
-            filtered_interests.append(interest)
-
-        return filtered_interests
-
-    except Exception as e:
-        print(f"[ERROR] extract_interests tool: {e}")
-        return []
+    """Extract student interests from conversation history using structured prompt.
+
+    A failed LLM call raises instead of returning no interests, so the
+    caller can keep the messages for the next attempt.
+    """
+    llm = get_llm()
+    chat_history = format_conversation_history(messages)
+    prompt = extract_interest_prompt.format(chat_history=chat_history)
+
+    response = llm.invoke(prompt)
+    return _parse_interests(response.content)
+
+async def aextract_interests(messages: List[BaseMessage]) -> List[str]:
+    """Async version of extract_interests."""
+    llm = get_llm()
+    chat_history = format_conversation_history(messages)
+    prompt = extract_interest_prompt.format(chat_history=chat_history)
+
+    response = await llm.ainvoke(prompt)
+    return _parse_interests(response.content)
@@ -0,0 +1,69 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that appear in most queries or course texts and say nothing about the topic.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in", "into", "is",
+    "it", "me", "my", "of", "on", "or", "that", "the", "this", "to", "with", "you", "your",
+    "course", "courses", "class", "classes", "grade", "grades", "interested", "interest",
+    "interests", "like", "about", "some", "want",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with a plain plural 's' removed."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over a fixed list of tokenized documents,
+    addressed by the same positions as the FAISS index."""
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = 1.2, b: float = 0.75):
+        self.size = len(documents)
+        lengths = np.array([len(tokens) for tokens in documents], dtype="float32")
+        average = float(lengths.mean()) if self.size else 0.0
+        # Per-document length normalisation, computed once.
+        norms = k1 * (1 - b + b * lengths / average) if average else np.full(self.size, k1, dtype="float32")
+
+        positions: Dict[str, List[int]] = defaultdict(list)
+        frequencies: Dict[str, List[int]] = defaultdict(list)
+        for position, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                positions[term].append(position)
+                frequencies[term].append(count)
+
+        self._postings: Dict[str, tuple] = {}
+        for term, term_positions in positions.items():
+            ids = np.array(term_positions, dtype="int64")
+            tf = np.array(frequencies[term], dtype="float32")
+            idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            self._postings[term] = (ids, idf * tf * (k1 + 1) / (tf + norms[ids]))
+
+    def search(self, terms: List[str], n: int, mask: Optional[np.ndarray] = None) -> List[int]:
+        """Positions of the n best-scoring documents containing any of terms,
+        restricted to mask when given."""
+        scores = np.zeros(self.size, dtype="float32")
+        for term in set(terms):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
@@ -1,67 +1,160 @@
 import json
 import logging
-from typing import List
+import re
+from typing import Any, Iterator, List, Optional
 from langchain.docstore.document import Document
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def load_course_data(path: str = "src/data/courses.json") -> List[Document]:
-    """Load course data from JSON file and convert to Document objects."""
+# Bytes read from the catalog at a time; only one course object (plus this
+# much look-ahead) is held in memory while streaming.
+READ_SIZE = 1 << 16
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class CatalogStats:
+    """Counts kept while a catalog is streamed."""
+
+    def __init__(self):
+        self.loaded = 0
+        self.skipped = 0
+
+
+def iter_json_items(path: str) -> Iterator[Any]:
+    """Yield the items of a JSON array, or the values of a JSON Lines file,
+    one at a time without reading the whole file.
+
+    Anything else raises RuntimeError: a top-level object such as
+    {"courses": [...]}, missing or doubled commas, JSON Lines values that
+    share or span lines, and data after the closing bracket.
+    """
+    decoder = json.JSONDecoder()
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            course_data = json.load(f)
+        f = open(path, "r", encoding="utf-8")
     except FileNotFoundError:
         raise RuntimeError(f"Course data file not found at {path}")
-    except json.JSONDecodeError:
-        raise RuntimeError(f"Invalid JSON format in {path}")
-    except Exception as e:
-        raise RuntimeError(f"Failed to load course data: {e}")
 
-    if not isinstance(course_data, list):
-        raise RuntimeError("Course data must be a list of course objects")
+    def invalid(reason: str) -> RuntimeError:
+        return RuntimeError(f"Invalid JSON format in {path}: {reason}")
+
+    with f:
+        buffer, pos, eof = "", 0, False
+        in_array = None  # decided by the first non-blank character
+        expect = "first"  # in an array: "first", "value", "separator" or "end"
+        newline = True  # in JSON Lines: a line break since the last value
+        while True:
+            blank = _WHITESPACE.match(buffer, pos).end()
+            newline = newline or "\n" in buffer[pos:blank]
+            pos = blank
+            if pos < len(buffer):
+                char = buffer[pos]
+                if in_array is None:
+                    in_array = char == "["
+                    pos += in_array
+                    continue
+                if in_array:
+                    if expect == "end":
+                        raise invalid("data after the closing bracket")
+                    if char == "]" and expect != "value":
+                        expect = "end"
+                        pos += 1
+                        continue
+                    if expect == "separator":
+                        if char != ",":
+                            raise invalid("expected ',' or ']' between items")
+                        expect = "value"
+                        pos += 1
+                        continue
+                    if char in ",]":
+                        raise invalid("missing item")
+                elif not newline:
+                    raise invalid("JSON Lines values must each be on a line of their own")
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise invalid("malformed value")
+                else:
+                    # A number at the end of the buffer may continue in the next read.
+                    if end < len(buffer) or eof or not isinstance(item, (int, float)):
+                        if not in_array and ("\n" in buffer[pos:end] or _wrapped_catalog(item)):
+                            raise RuntimeError("Course data must be a list of course objects (a JSON array or JSON Lines)")
+                        pos = end
+                        expect, newline = "separator", False
+                        yield item
+                        continue
+            elif eof:
+                if in_array and expect != "end":
+                    raise invalid("unterminated array")
+                return
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+
+def _wrapped_catalog(item: Any) -> bool:
+    """An object holding a list of course objects rather than being a course."""
+    return isinstance(item, dict) and "courseId" not in item and any(
+        isinstance(value, list) and value and isinstance(value[0], dict) for value in item.values()
+    )
 
-    docs = []
-    skipped = 0
 
-    for item in course_data:
-        if not isinstance(item, dict):
-            skipped += 1
+def course_document(item: Any) -> Optional[Document]:
+    """The Document for one catalog item, or None if the item is invalid."""
+    if not isinstance(item, dict):
+        return None
+
+    subjects = item.get("subjects", [])
+    if isinstance(subjects, str):
+        subjects = [s.strip() for s in subjects.split(",") if s.strip()]
+
+    grades = item.get("grades", [])
+    if isinstance(grades, str):
+        grades = [g.strip() for g in grades.split(",") if g.strip()]
+
+    content = (
+        f"courseId: {item.get('courseId', 'N/A')}\n"
+        f"Title: {item.get('title', 'N/A')}\n"
+        f"Description: {item.get('description', 'N/A').strip()}\n"
+        f"Subjects: {', '.join(subjects)}\n"
+        f"Grade: {', '.join(grades)}\n"
+        f"isDualCredit: {item.get('isDualCredit', False)}\n"
+        f"isCreditRecovery: {item.get('isCreditRecovery', False)}\n"
+        f"HigherEdCredits: {item.get('higherEdCredits', 0)}"
+    )
+
+    metadata = {
+        "courseId": item.get("courseId", "N/A"),
+        "title": item.get("title", "N/A"),
+        "subjects": subjects,
+        "grades": grades,
+        "isDualCredit": item.get("isDualCredit", False),
+        "isCreditRecovery": item.get("isCreditRecovery", False)
+    }
+    return Document(page_content=content, metadata=metadata)
+
+
+def stream_course_data(path: str = "src/data/courses.json", stats: Optional[CatalogStats] = None) -> Iterator[Document]:
+    """Yield course Documents one at a time from a JSON array or JSON Lines
+    catalog; invalid items are skipped, counted and reported at the end."""
+    stats = stats or CatalogStats()
+    for item in iter_json_items(path):
+        try:
+            doc = course_document(item)
+        except (AttributeError, TypeError):
+            doc = None
+        if doc is None:
+            stats.skipped += 1
             continue
+        stats.loaded += 1
+        yield doc
+
+    logger.info(f"Loaded {stats.loaded} course documents")
+    if stats.skipped:
+        logger.warning(f"Skipped {stats.skipped} invalid course items")
+
 
-        subjects = item.get("subjects", [])
-        if isinstance(subjects, str):
-            subjects = [s.strip() for s in subjects.split(",") if s.strip()]
-
-        grades = item.get("grades", [])
-        if isinstance(grades, str):
-            grades = [g.strip() for g in grades.split(",") if g.strip()]
-
-        content = (
-            f"courseId: {item.get('courseId', 'N/A')}\n"
-            f"Title: {item.get('title', 'N/A')}\n"
-            f"Description: {item.get('description', 'N/A').strip()}\n"
-            f"Subjects: {', '.join(subjects)}\n"
-            f"Grade: {', '.join(grades)}\n"
-            f"isDualCredit: {item.get('isDualCredit', False)}\n"
-            f"isCreditRecovery: {item.get('isCreditRecovery', False)}\n"
-            f"HigherEdCredits: {item.get('higherEdCredits', 0)}"
-        )
-
-        metadata = {
-            "courseId": item.get("courseId", "N/A"),
-            "title": item.get("title", "N/A"),
-            "subjects": subjects,
-            "grades": grades,
-            "isDualCredit": item.get("isDualCredit", False),
-            "isCreditRecovery": item.get("isCreditRecovery", False)
-        }
-
-        docs.append(Document(page_content=content, metadata=metadata))
-
-    logger.info(f"Loaded {len(docs)} course documents")
-    if skipped:
-        logger.warning(f"Skipped {skipped} invalid course items")
-
-    return docs
+def load_course_data(path: str = "src/data/courses.json") -> List[Document]:
+    """Load course data from JSON file and convert to Document objects."""
+    return list(stream_course_data(path))
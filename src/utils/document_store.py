@@ -0,0 +1,164 @@
+import json
+import mmap
+import os
+from array import array
+from typing import Any, Dict, List
+import numpy as np
+from langchain.docstore.document import Document
+
+# Metadata filters precomputed as fixed-width columns, so the retriever can
+# build its grade and credit filters without decoding any document.
+MAX_GRADE = 31
+COURSES_FILE = "courses.npy"
+
+
+class _StringColumn:
+    """Variable-length UTF-8 values stored back to back, located through an
+    (n + 1) int64 offset array."""
+
+    def __init__(self, path: str, name: str):
+        self.offsets = np.load(os.path.join(path, f"{name}.idx.npy"), mmap_mode="r")
+        with open(os.path.join(path, f"{name}.bin"), "rb") as f:
+            # Zero-length files cannot be mapped.
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __getitem__(self, position: int) -> str:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.data[start:end].decode("utf-8")
+
+
+
+class _StringColumnWriter:
+    """Appends values to a column file; only the offsets stay in memory."""
+
+    def __init__(self, path: str, name: str):
+        self.path, self.name = path, name
+        self._file = open(os.path.join(path, f"{name}.bin"), "wb")
+        self._offsets = array("q", [0])
+
+    def append(self, value: str):
+        encoded = value.encode("utf-8")
+        self._file.write(encoded)
+        self._offsets.append(self._offsets[-1] + len(encoded))
+
+    def close(self):
+        self._file.close()
+        np.save(os.path.join(self.path, f"{self.name}.idx.npy"), np.frombuffer(self._offsets, dtype="int64"))
+
+
+class DocumentStore:
+    """Read-only columnar store of the indexed chunks, addressed by FAISS position.
+
+    Every column is memory-mapped, so opening the store costs a few syscalls
+    and worker processes share one copy through the page cache. Documents are
+    only decoded when a search returns them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ids = _StringColumn(path, "ids")
+        self._text = _StringColumn(path, "text")
+        self._metadata = _StringColumn(path, "metadata")
+        self.grades = np.load(os.path.join(path, "grades.npy"), mmap_mode="r")
+        self.dual_credit = np.load(os.path.join(path, "dual_credit.npy"), mmap_mode="r")
+        self.credit_recovery = np.load(os.path.join(path, "credit_recovery.npy"), mmap_mode="r")
+        courses_path = os.path.join(path, COURSES_FILE)
+        if os.path.exists(courses_path):
+            self.courses = np.load(courses_path, mmap_mode="r")
+        else:
+            # Stores written before the column existed: derive it from the chunk ids.
+            self.courses = _course_ordinals(doc_id.rsplit(":", 1)[0] for doc_id in self.ids())
+
+    def __len__(self) -> int:
+        return len(self._ids.offsets) - 1
+
+    def doc_id(self, position: int) -> str:
+        return self._ids[position]
+
+    @property
+    def course_count(self) -> int:
+        return int(self.courses[-1]) + 1 if len(self.courses) else 0
+
+    def ids(self) -> List[str]:
+        return [self._ids[position] for position in range(len(self))]
+
+    def get(self, position: int) -> Document:
+        return Document(page_content=self._text[position], metadata=json.loads(self._metadata[position]))
+
+    @staticmethod
+    def write(path: str, ids: List[str], docs: List[Document]):
+        with DocumentStoreWriter(path) as writer:
+            for doc_id, doc in zip(ids, docs):
+                writer.add(doc_id, doc)
+
+
+class DocumentStoreWriter:
+    """Writes a DocumentStore one chunk at a time, so a build never holds
+    the chunks themselves; per chunk only offsets and filter values are kept
+    until close()."""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._ids = _StringColumnWriter(path, "ids")
+        self._text = _StringColumnWriter(path, "text")
+        self._metadata = _StringColumnWriter(path, "metadata")
+        self._grades = array("I")
+        self._dual_credit = array("B")
+        self._credit_recovery = array("B")
+        self._courses = array("i")
+        self._last_course = None
+
+    def __enter__(self) -> "DocumentStoreWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._grades)
+
+    def add(self, doc_id: str, doc: Document):
+        self._ids.append(doc_id)
+        self._text.append(doc.page_content)
+        self._metadata.append(json.dumps(doc.metadata, default=str))
+        self._grades.append(_grade_mask(doc.metadata))
+        self._dual_credit.append(bool(doc.metadata.get("isDualCredit")))
+        self._credit_recovery.append(bool(doc.metadata.get("isCreditRecovery")))
+        # Chunks of one course are added together, so a new courseId starts a new ordinal.
+        course = str(doc.metadata.get("courseId", "N/A"))
+        if course != self._last_course:
+            self._last_course = course
+            self._courses.append(self._courses[-1] + 1 if self._courses else 0)
+        else:
+            self._courses.append(self._courses[-1])
+
+    def close(self):
+        for column in (self._ids, self._text, self._metadata):
+            column.close()
+        np.save(os.path.join(self.path, "grades.npy"), np.frombuffer(self._grades, dtype="uint32"))
+        np.save(os.path.join(self.path, "dual_credit.npy"), np.frombuffer(self._dual_credit, dtype="uint8").astype(bool))
+        np.save(os.path.join(self.path, "credit_recovery.npy"), np.frombuffer(self._credit_recovery, dtype="uint8").astype(bool))
+        np.save(os.path.join(self.path, COURSES_FILE), np.frombuffer(self._courses, dtype="int32"))
+
+
+def _course_ordinals(keys) -> np.ndarray:
+    """0 for the first course, 1 for the next, ...; chunks of a course are adjacent."""
+    ordinals, last = array("i"), None
+    for key in keys:
+        if key != last:
+            ordinals.append(ordinals[-1] + 1 if ordinals else 0)
+            last = key
+        else:
+            ordinals.append(ordinals[-1])
+    return np.frombuffer(ordinals, dtype="int32")
+
+
+def _grade_mask(metadata: Dict[str, Any]) -> int:
+    """Bit g is set when the chunk's course is offered in grade g."""
+    mask = 0
+    for grade in metadata.get("grades", []):
+        grade = str(grade).strip()
+        if grade.isdigit() and int(grade) <= MAX_GRADE:
+            mask |= 1 << int(grade)
+    return mask
@@ -0,0 +1,57 @@
+import re
+import threading
+
+_TOKEN_RE = re.compile(r"[a-z][a-z'.]*")
+
+# Words that never carry an interest on their own: acknowledgements, chat
+# filler and common function words.
+FILLER_WORDS = {
+    "ok", "okay", "k", "kk", "lol", "lmao", "haha", "hahaha", "hmm", "hm", "um", "uh",
+    "yes", "yeah", "yep", "yup", "ya", "no", "nope", "nah", "sure", "maybe", "idk",
+    "please", "pls", "thanks", "thank", "thx", "ty", "cool", "nice", "great", "good",
+    "fine", "alright", "right", "hi", "hello", "hey", "bye", "wow", "oh", "ah", "sounds",
+    "i", "i'm", "im", "me", "my", "you", "your", "we", "it", "it's", "that", "that's",
+    "this", "so", "a", "an", "the", "and", "or", "but", "to", "of", "in", "on", "for",
+    "is", "are", "was", "be", "do", "don't", "dont", "know", "guess", "think", "what",
+    "about", "how", "why", "really", "just", "not", "too", "very", "go", "ahead",
+    "course", "courses", "recommend", "recommendation", "recommendations", "more", "some",
+}
+
+
+class InterestGate:
+    """Cheap local check that decides whether a message is worth sending to the
+    interest-extraction LLM, with counters for how many calls it saved."""
+
+    def __init__(self):
+        self.passed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def has_signal(self, text: str) -> bool:
+        """False only for messages made up entirely of filler, e.g. "ok" or
+        "yes please". Any other word may name an interest the catalog does
+        not spell out ("volleyball", "k-pop"), so it goes to the LLM."""
+        tokens = [t.strip("'.") for t in _TOKEN_RE.findall(text.lower())]
+        return any(t and t not in FILLER_WORDS for t in tokens)
+
+    def should_extract(self, text: str) -> bool:
+        """Run the check and record whether the LLM call goes ahead or is skipped."""
+        allowed = self.has_signal(text)
+        with self._lock:
+            if allowed:
+                self.passed += 1
+            else:
+                self.skipped += 1
+        return allowed
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.passed + self.skipped
+            return {
+                "llm_calls": self.passed,
+                "skipped": self.skipped,
+                "skip_rate": round(self.skipped / total, 3) if total else 0.0,
+            }
+
+
+interest_gate = InterestGate()
@@ -0,0 +1,54 @@
+import threading
+from collections import Counter
+from typing import Any, Dict
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts the LLM calls made during one graph run; pass it in the run's
+    config callbacks and every nested model call is counted."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, **kwargs: Any) -> None:
+        self._count()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, **kwargs: Any) -> None:
+        self._count()
+
+
+class LLMCallStats:
+    """Per-agent-mode totals and distribution of LLM calls per turn."""
+
+    def __init__(self):
+        self._turns: Dict[str, int] = Counter()
+        self._calls: Dict[str, int] = Counter()
+        self._per_turn: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, calls: int):
+        with self._lock:
+            self._turns[mode] += 1
+            self._calls[mode] += calls
+            self._per_turn.setdefault(mode, Counter())[calls] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                mode: {
+                    "turns": turns,
+                    "llm_calls": self._calls[mode],
+                    "llm_calls_per_turn": round(self._calls[mode] / turns, 2),
+                    "turns_by_llm_calls": {str(k): v for k, v in sorted(self._per_turn[mode].items())},
+                }
+                for mode, turns in self._turns.items()
+            }
+
+
+llm_call_stats = LLMCallStats()
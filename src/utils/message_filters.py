@@ -1,6 +1,15 @@
+import os
 from typing import List
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
+# Rough budget for the recent turns sent with every LLM prompt. Prompts get
+# the rolling summary plus every turn after it; once those turns grow past the
+# budget, the older ones are folded into the summary down to
+# SUMMARY_KEEP_TOKENS, so nothing falls between the summary and the prompt and
+# the headroom left keeps the fold from running on every turn.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_KEEP_TOKENS = min(int(os.getenv("SUMMARY_KEEP_TOKENS", str(HISTORY_TOKEN_BUDGET // 2))), HISTORY_TOKEN_BUDGET)
+
 def filter_recent_messages(messages: List[BaseMessage], max_messages: int = 10) -> List[BaseMessage]:
     return messages[-max_messages:] if len(messages) > max_messages else messages
 
@@ -11,12 +20,36 @@ def filter_by_message_type(messages: List[BaseMessage], include_types: List[str]
             filtered.append(msg)
     return filtered
 
-def format_conversation_history(messages: List[BaseMessage], max_exchanges: int = 5) -> str:
-    recent_messages = filter_recent_messages(messages, max_exchanges * 2)
-    
-    formatted = ""
-    for msg in recent_messages:
-        role = "Student" if isinstance(msg, HumanMessage) else "Bot"
-        formatted += f"{role}: {msg.content}\n"
-    
-    return formatted.strip()
\ No newline at end of file
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def message_tokens(msg: BaseMessage) -> int:
+    return estimate_tokens(msg.content if isinstance(msg.content, str) else str(msg.content))
+
+def history_window(messages: List[BaseMessage], max_tokens: int = HISTORY_TOKEN_BUDGET) -> List[BaseMessage]:
+    """Most recent messages that fit in max_tokens, starting on a student turn.
+
+    Walks back from the end, so the cost depends on the window, not on the
+    length of the conversation.
+    """
+    start = len(messages)
+    used = 0
+    while start > 0:
+        used += message_tokens(messages[start - 1])
+        if used > max_tokens and start < len(messages):
+            break
+        start -= 1
+
+    while start < len(messages) - 1 and not isinstance(messages[start], HumanMessage):
+        start += 1
+    return messages[start:]
+
+def format_conversation_history(messages: List[BaseMessage], summary: str = "") -> str:
+    """The summary and the given turns; callers pass the turns after the summary watermark."""
+    lines = [f"Summary of the earlier conversation: {summary}"] if summary else []
+    lines.extend(
+        f"{'Student' if isinstance(msg, HumanMessage) else 'Bot'}: {msg.content}"
+        for msg in messages
+    )
+    return "\n".join(lines).strip()
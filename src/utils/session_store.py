@@ -0,0 +1,314 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver
+from src.schema.state import CourseRecommenderState
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite")
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_COOKIE = "session_id"
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def initial_state() -> CourseRecommenderState:
+    return CourseRecommenderState(
+        messages=[],
+        grade=None,
+        interests=[],
+        interest_watermark=0,
+        summary="",
+        summary_watermark=0,
+        credit_preference="any",
+        conversation_stage="greeting",
+        interest_turns=0,
+        has_offered_recommendation=False,
+        next_action=None,
+        agent_scratchpad="",
+        retrieved_courses=[],
+        last_recommendation=None
+    )
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver that keeps only the latest checkpoint of each session and
+    evicts the least recently used sessions beyond max_sessions or idle for
+    longer than ttl seconds.
+
+    Channel values are kept as live objects rather than serialized blobs, so
+    saving and resuming a session does not encode or rebuild every message of
+    the history. The graph's reducers return new objects instead of mutating
+    old values, which makes sharing them safe."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._blob_keys = defaultdict(set)
+        self._write_keys = defaultdict(set)
+        self._live_values: Dict[tuple, Any] = {}
+        self._bookkeeping = threading.RLock()
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        with self._bookkeeping:
+            self._evict()
+            # storage and writes are defaultdicts, so reading an unknown
+            # session would leave empty entries behind.
+            if thread_id not in self.storage:
+                return None
+            if thread_id in self._last_seen:
+                self._last_seen[thread_id] = time.monotonic()
+                self._last_seen.move_to_end(thread_id)
+            result = super().get_tuple(config)
+            if result is not None:
+                configurable = result.config["configurable"]
+                self._write_keys[thread_id].add(
+                    (thread_id, configurable["checkpoint_ns"], configurable["checkpoint_id"])
+                )
+            return self._with_live_values(result)
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        with self._bookkeeping:
+            results = [self._with_live_values(result)
+                       for result in super().list(config, filter=filter, before=before, limit=limit)]
+        yield from results
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._bookkeeping:
+            values = checkpoint["channel_values"]
+            result = super().put(config, {**checkpoint, "channel_values": {}}, metadata, new_versions)
+            self._blob_keys[thread_id].update((thread_id, checkpoint_ns, k, v) for k, v in new_versions.items())
+            for k, v in new_versions.items():
+                if k in values:
+                    self._live_values[(thread_id, checkpoint_ns, k, v)] = values[k]
+            if checkpoint_ns == "":
+                self._prune(thread_id, checkpoint)
+            self._last_seen[thread_id] = time.monotonic()
+            self._last_seen.move_to_end(thread_id)
+            self._evict()
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._bookkeeping:
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys[thread_id].add(
+                (thread_id, config["configurable"]["checkpoint_ns"], config["configurable"]["checkpoint_id"])
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._bookkeeping:
+            self._drop(thread_id)
+
+    def _with_live_values(self, result: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        """result with the channel values put() kept as live objects; the
+        saved checkpoint holds them as empty blobs."""
+        if result is None:
+            return None
+        configurable = result.config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        values = dict(result.checkpoint["channel_values"])
+        for k, v in result.checkpoint["channel_versions"].items():
+            key = (thread_id, checkpoint_ns, k, v)
+            if key in self._live_values:
+                values[k] = self._live_values[key]
+        return result._replace(checkpoint={**result.checkpoint, "channel_values": values})
+
+    def _prune(self, thread_id: str, checkpoint):
+        """Drop older checkpoints, subgraph checkpoints and unreferenced blobs."""
+        namespaces = self.storage.get(thread_id, {})
+        for checkpoint_ns in [ns for ns in namespaces if ns]:
+            del namespaces[checkpoint_ns]
+        root = namespaces.get("", {})
+        for checkpoint_id in [cid for cid in root if cid != checkpoint["id"]]:
+            del root[checkpoint_id]
+
+        live_blobs = {(thread_id, "", k, v) for k, v in checkpoint["channel_versions"].items()}
+        for key in self._blob_keys[thread_id] - live_blobs:
+            self.blobs.pop(key, None)
+            self._live_values.pop(key, None)
+        self._blob_keys[thread_id] &= live_blobs
+
+        live_writes = (thread_id, "", checkpoint["id"])
+        for key in self._write_keys[thread_id] - {live_writes}:
+            self.writes.pop(key, None)
+        self._write_keys[thread_id] &= {live_writes}
+
+    def _drop(self, thread_id: str):
+        self.storage.pop(thread_id, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+            self._live_values.pop(key, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        self._last_seen.pop(thread_id, None)
+
+    def _evict(self):
+        while len(self._last_seen) > self.max_sessions:
+            self._drop(next(iter(self._last_seen)))
+        expired_before = time.monotonic() - self.ttl
+        while self._last_seen and next(iter(self._last_seen.values())) < expired_before:
+            self._drop(next(iter(self._last_seen)))
+
+    def session_count(self) -> int:
+        return len(self._last_seen)
+
+
+def _create_sqlite_saver(path: str, max_sessions: int, ttl: float) -> BaseCheckpointSaver:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class BoundedSqliteSaver(SqliteSaver):
+        """SqliteSaver that keeps only the latest checkpoint of each session and
+        deletes sessions that are idle or beyond max_sessions. Every worker
+        process pointing at the same file shares the sessions."""
+
+        def setup(self) -> None:
+            if self.is_setup:
+                return
+            super().setup()
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    thread_id TEXT PRIMARY KEY,
+                    last_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+                """
+            )
+
+        def put(self, config: RunnableConfig, checkpoint, metadata, new_versions):
+            result = super().put(config, checkpoint, metadata, new_versions)
+            if config["configurable"].get("checkpoint_ns", "") != "":
+                return result
+
+            thread_id = str(config["configurable"]["thread_id"])
+            with self.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id != ?",
+                    (thread_id, checkpoint["id"])
+                )
+                cur.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id != ?",
+                    (thread_id, checkpoint["id"])
+                )
+                cur.execute(
+                    "INSERT OR REPLACE INTO sessions (thread_id, last_seen) VALUES (?, ?)",
+                    (thread_id, time.time())
+                )
+                expired = cur.execute(
+                    "SELECT thread_id FROM sessions WHERE last_seen < ?", (time.time() - ttl,)
+                ).fetchall()
+                expired += cur.execute(
+                    "SELECT thread_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?", (max_sessions,)
+                ).fetchall()
+                for (expired_id,) in set(expired):
+                    for table in ("checkpoints", "writes", "sessions"):
+                        cur.execute(f"DELETE FROM {table} WHERE thread_id = ?", (expired_id,))
+            return result
+
+        def delete_thread(self, thread_id: str) -> None:
+            super().delete_thread(thread_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM sessions WHERE thread_id = ?", (str(thread_id),))
+
+        def session_count(self) -> int:
+            with self.cursor(transaction=False) as cur:
+                return cur.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+        # SqliteSaver has no async methods. The sqlite calls can block for up
+        # to the connection timeout while another process holds the write
+        # lock, so they run on a worker thread instead of the event loop.
+        async def aget_tuple(self, config: RunnableConfig):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator:
+            items = await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+            )
+            for item in items:
+                yield item
+
+        async def aput(self, config: RunnableConfig, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = "") -> None:
+            await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id: str) -> None:
+            await asyncio.to_thread(self.delete_thread, thread_id)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    return BoundedSqliteSaver(conn)
+
+
+def create_checkpointer(
+    backend: str = SESSION_BACKEND,
+    max_sessions: int = MAX_SESSIONS,
+    ttl: float = SESSION_TTL,
+    path: str = SESSION_DB_PATH
+) -> BaseCheckpointSaver:
+    """Checkpointer for the configured session backend."""
+    if backend == "sqlite":
+        return _create_sqlite_saver(path, max_sessions, ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return BoundedMemorySaver(max_sessions, ttl)
+
+
+class SessionStore:
+    """Per-user conversation state, read from and written to the graph's
+    checkpointer with the session id as the thread id."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.checkpointer = graph.checkpointer
+
+    @staticmethod
+    def config(session_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": session_id}}
+
+    def load(self, session_id: str) -> CourseRecommenderState:
+        """Current state of the session, or a fresh one."""
+        snapshot = self.graph.get_state(self.config(session_id))
+        return {**initial_state(), **snapshot.values}
+
+    async def aload(self, session_id: str) -> CourseRecommenderState:
+        snapshot = await self.graph.aget_state(self.config(session_id))
+        return {**initial_state(), **snapshot.values}
+
+    def update(self, session_id: str, values: Dict[str, Any]):
+        """Write values into the session without running the graph."""
+        self.graph.update_state(self.config(session_id), values)
+
+    async def aupdate(self, session_id: str, values: Dict[str, Any]):
+        await self.graph.aupdate_state(self.config(session_id), values)
+
+    def delete(self, session_id: str):
+        self.checkpointer.delete_thread(session_id)
+
+    async def adelete(self, session_id: str):
+        await self.checkpointer.adelete_thread(session_id)
+
+    def session_count(self) -> Optional[int]:
+        counter = getattr(self.checkpointer, "session_count", None)
+        return counter() if counter else None
+
+    async def asession_count(self) -> Optional[int]:
+        """session_count on a worker thread; the sqlite backend can wait on another process's lock."""
+        return await asyncio.to_thread(self.session_count)
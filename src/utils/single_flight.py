@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from src.utils.metrics import metrics
+
+_groups: "weakref.WeakSet[SingleFlight]" = weakref.WeakSet()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller of a key runs the function; callers arriving while it
+    is in flight wait for and share its result or exception. Nothing is kept
+    once the call finishes, so this is not a cache. Threads (do) and
+    coroutines (ado) are coalesced separately, coroutines per event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        _groups.add(self)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """fn()'s result, and whether it was shared from another caller's call."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of do; a waiter whose leader is cancelled runs the call itself."""
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        while True:
+            with self._lock:
+                future = self._futures.get(key)
+                leader = future is None
+                if leader:
+                    future = self._futures[key] = loop.create_future()
+                self._count(leader)
+
+            if leader:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this waiter was cancelled, not the call
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, so an unshared failure is not logged twice
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+    def _count(self, leader: bool):
+        if leader:
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        metrics.increment("single_flight_calls_total", call=self.name, outcome="executed" if leader else "coalesced")
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / calls, 3) if calls else 0.0,
+                "in_flight": len(self._calls) + len(self._futures),
+            }
+
+
+def single_flight_stats() -> Dict[str, dict]:
+    """Counts of every live SingleFlight, summed by name."""
+    totals: Dict[str, dict] = {}
+    for group in list(_groups):
+        stats = group.stats()
+        total = totals.setdefault(group.name, {"executed": 0, "coalesced": 0, "in_flight": 0})
+        for field in total:
+            total[field] += stats[field]
+    for total in totals.values():
+        calls = total["executed"] + total["coalesced"]
+        total["coalesced_rate"] = round(total["coalesced"] / calls, 3) if calls else 0.0
+    return totals
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.outputs import LLMResult
+from src.utils.llm_call_counter import LLMCallCounter
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Write every turn's trace as JSON into this directory; unset disables dumps.
+TRACE_DIR = os.getenv("TRACE_DIR")
+
+
+class TurnTrace(LLMCallCounter):
+    """Callback handler that times one graph run.
+
+    Records a span per graph node and per LLM call (with token usage), feeds
+    them into the process metrics as they finish and can dump the whole turn
+    as JSON. Pass it in the run's config callbacks.
+    """
+
+    def __init__(self, user_id: str = "", mode: str = ""):
+        super().__init__()
+        self.trace_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+
+    def _start(self, run_id: UUID, kind: str, name: str, node: Optional[str]):
+        with self._lock:
+            self._open[run_id] = {
+                "kind": kind,
+                "name": name,
+                "node": node,
+                "start_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                "_started": time.perf_counter(),
+            }
+
+    def _end(self, run_id: UUID, **fields: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return None
+            seconds = time.perf_counter() - span.pop("_started")
+            span["duration_ms"] = round(seconds * 1000, 3)
+            span.update(fields)
+            self.spans.append(span)
+        span["_seconds"] = seconds
+        return span
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        # Runnables nested inside a node inherit its metadata (and the node's
+        # function runs under the node's name); only the outermost run counts.
+        if node and kwargs.get("name") == node and parent_run_id not in self._open:
+            self._start(run_id, "node", node, node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._end(run_id)
+        if span is not None:
+            metrics.observe("graph_node_seconds", span.pop("_seconds"), node=span["name"])
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._end(run_id, error=str(error))
+        if span is not None:
+            metrics.observe("graph_node_seconds", span.pop("_seconds"), node=span["name"])
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        super().on_chat_model_start(serialized, messages, run_id=run_id, metadata=metadata, **kwargs)
+        node = (metadata or {}).get("langgraph_node") or "none"
+        self._start(run_id, "llm", _model_name(serialized, kwargs), node)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        super().on_llm_start(serialized, prompts, run_id=run_id, metadata=metadata, **kwargs)
+        node = (metadata or {}).get("langgraph_node") or "none"
+        self._start(run_id, "llm", _model_name(serialized, kwargs), node)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt, completion = _token_usage(response)
+        span = self._end(run_id, prompt_tokens=prompt, completion_tokens=completion)
+        if span is None:
+            return
+        with self._lock:
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+        node = span["node"]
+        metrics.observe("llm_call_seconds", span.pop("_seconds"), node=node)
+        metrics.increment("llm_calls_total", node=node)
+        metrics.observe("llm_prompt_tokens", prompt)
+        metrics.observe("llm_completion_tokens", completion)
+        metrics.increment("llm_tokens_total", prompt, kind="prompt")
+        metrics.increment("llm_tokens_total", completion, kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._end(run_id, error=str(error))
+        if span is not None:
+            metrics.observe("llm_call_seconds", span.pop("_seconds"), node=span["node"])
+
+    def finish(self) -> Dict[str, Any]:
+        """Record the turn's latency and return its trace, writing it to
+        TRACE_DIR when that is set."""
+        seconds = time.perf_counter() - self.started
+        metrics.observe("graph_turn_seconds", seconds, mode=self.mode)
+        trace = self.to_dict(seconds)
+        if TRACE_DIR:
+            try:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                path = os.path.join(TRACE_DIR, f"{int(self.started_at * 1000)}-{self.trace_id}.json")
+                with open(path, "w") as f:
+                    json.dump(trace, f, indent=2)
+            except OSError as e:
+                logger.warning(f"Could not write trace {self.trace_id}: {e}")
+        logger.debug(f"Turn {self.trace_id} took {seconds * 1000:.1f} ms with {self.calls} LLM call(s)")
+        return trace
+
+    def to_dict(self, seconds: Optional[float] = None) -> Dict[str, Any]:
+        if seconds is None:
+            seconds = time.perf_counter() - self.started
+        with self._lock:
+            spans = sorted((dict(span) for span in self.spans), key=lambda span: span["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "user_id": self.user_id,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_ms": round(seconds * 1000, 3),
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "spans": spans,
+        }
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    return kwargs.get("name") or (serialized or {}).get("name") or "llm"
+
+
+def _token_usage(response: LLMResult) -> tuple:
+    """(prompt, completion) tokens from usage_metadata, or from the provider's
+    llm_output when the messages carry none."""
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not (prompt or completion):
+        usage = (response.llm_output or {}).get("usage") or {}
+        prompt = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+        completion = usage.get("completion_tokens", usage.get("output_tokens", 0))
+    return prompt, completion
@@ -0,0 +1,120 @@
+"""Helpers shared by the Flask app (app.py) and the Quart app (async_app.py).
+
+Nothing here imports a web framework, so either server can use them without
+loading the other.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+from src.components import components
+from src.models.llm_config import USER_FACING_TAG
+from src.schema.state import CourseRecommenderState
+from src.utils.interest_gate import interest_gate
+from src.utils.llm_call_counter import llm_call_stats
+from src.utils.single_flight import single_flight_stats
+from src.utils.tracing import TurnTrace
+
+load_dotenv()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+TROUBLE_RESPONSE = "I'm having some trouble right now. Could you tell me about your interests or what subjects you enjoy?"
+# Arguments for graph.stream/astream that TurnStream translates.
+STREAM_OPTIONS = {"stream_mode": ["messages", "updates", "values"], "subgraphs": True}
+
+
+def configure_logging():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def latest_ai_response(state: CourseRecommenderState) -> str:
+    """Content of the last AI message, or a discovery nudge if there is none."""
+    ai_messages = [msg for msg in state["messages"] if msg.type == "ai"]
+    if ai_messages:
+        return ai_messages[-1].content
+    return "I'm here to help you explore courses! What subjects interest you?"
+
+
+def build_turn(data: Optional[dict]) -> Optional[Dict[str, Any]]:
+    """Graph input for a /chat request body, or None when it has no message.
+
+    The checkpointer holds the rest of the session; only the new turn is sent.
+    """
+    message = (data or {}).get("message")
+    if not message:
+        return None
+    turn = {"messages": [HumanMessage(content=message)]}
+    if "credit_type" in data:
+        turn["credit_preference"] = data["credit_type"]
+    return turn
+
+
+def turn_config(user_id: str):
+    """Session config for one turn, with a trace of the nodes and LLM calls it runs."""
+    trace = TurnTrace(user_id, components.agent.mode)
+    return {**components.sessions.config(user_id), "callbacks": [trace]}, trace
+
+
+def finish_turn(trace: TurnTrace) -> int:
+    """Record the turn's latency and LLM calls; returns the LLM call count."""
+    llm_call_stats.record(trace.mode, trace.calls)
+    trace.finish()
+    return trace.calls
+
+
+def metrics_gauges() -> dict:
+    """Cache hit rates and sizes of the components built so far."""
+    gauges = {"interest_gate_skip_rate": interest_gate.stats()["skip_rate"]}
+    retriever = components.peek("retriever")
+    if retriever is not None:
+        gauges["query_embedding_cache_hit_rate"] = retriever.embeddings.stats()["hit_rate"]
+        gauges["retrieval_lexical_only_rate"] = retriever.stats()["lexical_only_rate"]
+    agent = components.peek("agent")
+    if agent is not None:
+        gauges["recommendation_cache_hit_rate"] = agent.recommendation_cache.stats()["hit_rate"]
+    sessions = components.peek("sessions")
+    if sessions is not None:
+        gauges["active_sessions"] = sessions.session_count()
+    for name, stats in single_flight_stats().items():
+        gauges[f"single_flight_{name}_in_flight"] = stats["in_flight"]
+    return gauges
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TurnStream:
+    """Server-sent events for one streamed turn: `node` when a graph node
+    finishes, `token` for each user-facing LLM token (`id` changes when a new
+    LLM run starts) and `done` with the final response."""
+
+    def __init__(self, trace: TurnTrace):
+        self.trace = trace
+        self.result: Optional[CourseRecommenderState] = None
+
+    def events(self, item: Tuple[tuple, str, Any]) -> List[str]:
+        """Events for one (namespace, mode, chunk) item of a graph stream run with STREAM_OPTIONS."""
+        namespace, mode, chunk = item
+        if mode == "messages":
+            token, metadata = chunk
+            text = token.content if isinstance(token.content, str) else "".join(
+                block.get("text", "") for block in token.content if isinstance(block, dict)
+            )
+            if text and USER_FACING_TAG in (metadata.get("tags") or []):
+                return [sse_event("token", {"id": token.id, "text": text})]
+        elif namespace:
+            return []  # updates and values of subgraphs, e.g. the ReAct agent
+        elif mode == "updates":
+            return [sse_event("node", {"node": node}) for node in chunk]
+        else:
+            self.result = chunk
+        return []
+
+    def done(self) -> str:
+        return sse_event("done", {"response": latest_ai_response(self.result), "llm_calls": finish_turn(self.trace)})
+
+    @staticmethod
+    def error() -> str:
+        return sse_event("error", {"response": TROUBLE_RESPONSE})